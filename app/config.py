@@ -22,6 +22,10 @@ db = SQLAlchemy()
 migrate = Migrate()
 
 def create_app():
+    # Fork the password hashing processes while this process has no other threads yet
+    from app.passwords import password_hasher
+    password_hasher.start()
+
     app = Flask(__name__)
     CORS(app)
     app.config.from_object(Config)
@@ -35,6 +39,11 @@ def create_app():
     from app.routes import register_blueprints
     register_blueprints(app)
 
+    # Opt-in request/SQL instrumentation with a Prometheus /metrics endpoint
+    if os.getenv("PROFILING"):
+        from app.profiling import init_profiling
+        init_profiling(app)
+
     if not os.environ.get("FLASK_CLI"):
         from app.scheduler.scheduler import start_scheduler
         from app.scheduler.scheduler import scheduler
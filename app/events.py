@@ -0,0 +1,175 @@
+from collections import OrderedDict, defaultdict, deque
+import json
+import os
+import queue
+import threading
+import time
+
+
+# Sent first to a reconnecting client whose missed events are no longer buffered: reload from /user/get-user
+RESYNC = json.dumps({"type": "resync"})
+
+
+class LocalBroker:
+    """In-process broker: events only reach subscribers connected to this worker.
+
+    Event ids start from the clock in milliseconds, so they keep increasing across restarts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, user_id, message):
+        with self._lock:  # Delivered in id order
+            self._last_id = max(self._last_id + 1, int(time.time() * 1000))
+            self._deliver(user_id, self._last_id, message)
+
+
+class RedisBroker:
+    """Fans events out to the subscribers of every worker through Redis pub/sub.
+
+    Each user's events are numbered by a Redis counter, incremented and published in one script
+    so every worker sees them in id order.
+    """
+    prefix = "medify:events:"
+    publish_script = """
+        local event_id = redis.call('INCR', KEYS[1])
+        redis.call('PUBLISH', KEYS[2], event_id .. ' ' .. ARGV[1])
+        return event_id
+    """
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for this broker
+
+        self._redis = redis.Redis.from_url(url)
+        self._publish = self._redis.register_script(self.publish_script)
+
+    def start(self, deliver):
+        def listen():
+            # Resubscribes after connection errors (events published meanwhile are lost)
+            delay = 1
+            while True:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.psubscribe(self.prefix + "*")
+                    delay = 1
+                    for item in pubsub.listen():
+                        user_id = item["channel"].decode()[len(self.prefix):]
+                        event_id, message = item["data"].decode().split(" ", 1)
+                        deliver(user_id, int(event_id), message)
+                except Exception as e:
+                    print(f"[DEBUG] Event broker connection lost, reconnecting in {delay}s: {e}")
+                finally:
+                    pubsub.close()
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        threading.Thread(target=listen, name="event-broker", daemon=True).start()
+
+    def publish(self, user_id, message):
+        self._publish(keys=[self.prefix + "id:" + user_id, self.prefix + user_id], args=[message])
+
+
+class EventBus:
+    """Per-user pub/sub feeding the SSE and long-poll endpoints.
+
+    The last replay_size events of each user (for up to replay_seconds) are kept, so a client
+    reconnecting with the id of the last event it saw gets the ones published in between.
+    """
+
+    def __init__(self, broker, queue_size=100, replay_size=50, replay_seconds=300):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self.replay_seconds = replay_seconds
+        self._subscribers = defaultdict(set)  # user_id -> subscriber queues
+        self._recent = OrderedDict()  # user_id -> deque of (event_id, message, delivered at), least recent user first
+        self._dropped = {}  # user_id -> newest event id no longer in the replay buffer
+        self._lock = threading.Lock()
+        self._started = False
+
+    def subscribe(self, user_id, after=None):
+        """Queue receiving (event_id, message) tuples of the user's events.
+
+        With after (the id of the last event the client saw), the buffered events after it are queued
+        first, preceded by a RESYNC message if some of them were already dropped.
+        """
+        self._start()
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if after is not None:
+                missed = [(event_id, message) for event_id, message, _ in self._recent.get(user_id, ()) if event_id > after]
+                if after < self._dropped.get(user_id, after):
+                    missed.insert(0, (self._dropped[user_id], RESYNC))
+                for event in missed[-self.queue_size:]:
+                    subscriber.put_nowait(event)
+            self._subscribers[user_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            self._subscribers[user_id].discard(subscriber)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        """Send an event dict to every subscriber of the user. Never raises."""
+        self._start()
+        try:
+            self.broker.publish(user_id, json.dumps(event, default=str))
+        except Exception as e:
+            print(f"[DEBUG] Event publish failed: {e}")
+
+    def _deliver(self, user_id, event_id, message):
+        now = time.monotonic()
+        with self._lock:
+            # Buffered in the same critical section as subscribe(), so a new subscriber gets each event once
+            recent = self._recent.pop(user_id, None) or deque()
+            recent.append((event_id, message, now))
+            while len(recent) > self.replay_size:
+                self._dropped[user_id] = recent.popleft()[0]
+            self._recent[user_id] = recent
+            self._expire(now)
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event_id, message))
+            except queue.Full:
+                pass  # Slow client, it can resync from /user/get-user
+
+    def _expire(self, now):
+        """Drop the buffers of the users without an event in the replay window (only their last id is kept)"""
+        while self._recent:
+            user_id, recent = next(iter(self._recent.items()))
+            if now - recent[-1][2] < self.replay_seconds:
+                return
+            del self._recent[user_id]
+            self._dropped[user_id] = recent[-1][0]
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.broker.start(self._deliver)
+
+
+def create_event_bus():
+    """Build the bus with the broker selected by EVENT_BROKER (local or redis)"""
+    if os.getenv("EVENT_BROKER", "local") == "redis":
+        broker = RedisBroker(os.getenv("EVENT_BROKER_URL", "redis://localhost:6379/0"))
+    else:
+        broker = LocalBroker()
+    return EventBus(
+        broker,
+        replay_size=int(os.getenv("EVENT_REPLAY_SIZE", 50)),
+        replay_seconds=int(os.getenv("EVENT_REPLAY_SECONDS", 300))
+    )
+
+
+event_bus = create_event_bus()
@@ -0,0 +1,160 @@
+from collections import namedtuple
+from datetime import datetime
+import glob
+import gzip
+import json
+import os
+import time
+from app.config import db
+from app.models import MedicineLog, Medicine, Course, Patient
+
+# A medicine log read back from the archive (same fields the log endpoints return, plus its owners)
+ArchivedLog = namedtuple("ArchivedLog", ["id", "medicine_id", "patient_id", "user_id", "is_taken", "created_at", "updated_at"])
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def next_month(value):
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+class MedicineLogArchive:
+    """Moves whole months of old medicine logs out of the hot table into gzip JSONL files.
+
+    The hot table then only holds the last hot_months months, so its size and index depth stay bounded.
+    Files are partitioned by month and user (medicine_log-YYYY-MM/<user_id>/<part>.jsonl.gz), so reading
+    a window only opens the files of the requesting user.
+    """
+
+    def __init__(self, directory, hot_months, batch_size=1000):
+        self.directory = directory
+        self.hot_months = hot_months
+        self.batch_size = batch_size
+
+    def user_directory(self, month, user_id):
+        return os.path.join(self.directory, f"medicine_log-{month:%Y-%m}", str(user_id))
+
+    def paths(self, month, user_id):
+        """Archive files of a user's month (a month archived in several runs has several parts)"""
+        return sorted(glob.glob(os.path.join(glob.escape(self.user_directory(month, user_id)), "*.jsonl.gz")))
+
+    def cutoff(self, now):
+        """Start of the oldest month kept in the hot table"""
+        month = month_start(now)
+        for _ in range(self.hot_months):
+            month = datetime(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+        return month
+
+    def archive_cold_months(self, now):
+        """Archive every month older than the cutoff. Returns the number of logs moved."""
+        cutoff = self.cutoff(now)
+        oldest = db.session.query(db.func.min(MedicineLog.created_at)).scalar()
+
+        moved = 0
+        month = month_start(oldest) if oldest else cutoff
+        while month < cutoff:
+            moved += self.archive_month(month)
+            month = next_month(month)
+        return moved
+
+    def archive_month(self, month):
+        """Stream the logs of a month into new archive files (one per user), then delete them from the table"""
+        end = next_month(month)
+        rows = db.session.query(
+            MedicineLog.id,
+            MedicineLog.medicine_id,
+            Course.patient_id,
+            Patient.user_id,
+            MedicineLog.is_taken,
+            MedicineLog.created_at,
+            MedicineLog.updated_at
+        ).join(Medicine, MedicineLog.medicine_id == Medicine.id) \
+         .join(Course, Medicine.course_id == Course.id) \
+         .join(Patient, Course.patient_id == Patient.id) \
+         .filter(MedicineLog.created_at >= month, MedicineLog.created_at < end) \
+         .order_by(Patient.user_id, MedicineLog.created_at, MedicineLog.id) \
+         .yield_per(self.batch_size)
+
+        part = time.time_ns()
+        paths = []
+        archived = 0
+        f, user_id = None, None
+        try:
+            for row in rows:
+                log = ArchivedLog(*row)
+                if f is None or log.user_id != user_id:
+                    if f:
+                        f.close()
+                    user_id = log.user_id
+                    directory = self.user_directory(month, user_id)
+                    os.makedirs(directory, exist_ok=True)
+                    paths.append(os.path.join(directory, f"{part}.jsonl.gz"))
+                    f = gzip.open(paths[-1] + ".tmp", "wt", encoding="utf-8")
+                f.write(json.dumps(log._asdict(), default=str) + "\n")
+                archived += 1
+        except Exception:
+            if f:
+                f.close()
+            for path in paths:
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+            raise
+        finally:
+            if f:
+                f.close()
+
+        # Readers never see a half written file
+        for path in paths:
+            os.replace(path + ".tmp", path)
+
+        # Delete in small batches so the hot table is not locked for the whole month
+        # (if this is interrupted, the next run archives the rest again and readers skip the duplicates)
+        while True:
+            ids = [log_id for log_id, in db.session.query(MedicineLog.id)
+                   .filter(MedicineLog.created_at >= month, MedicineLog.created_at < end)
+                   .limit(self.batch_size)]
+            if not ids:
+                break
+            db.session.query(MedicineLog).filter(MedicineLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+        if archived:
+            print(f"[DEBUG] Archived {archived} medicine logs of {month:%Y-%m} for {len(paths)} users to {self.directory}")
+        return archived
+
+    def read_month(self, month, user_id):
+        seen = set()
+        for path in self.paths(month, user_id):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    log = json.loads(line)
+                    if log["id"] in seen:
+                        continue
+                    seen.add(log["id"])
+                    log["created_at"] = datetime.fromisoformat(log["created_at"])
+                    if log["updated_at"]:
+                        log["updated_at"] = datetime.fromisoformat(log["updated_at"])
+                    yield ArchivedLog(**log)
+
+    def read(self, since, until, user_id, medicine_ids):
+        """Archived logs of the user in [since, until) for the given medicines.
+
+        medicine_ids are the user's current medicines (authz.owned_medicine_ids), so the archived logs
+        of deleted medicines, courses and patients are never returned.
+        """
+        medicine_ids = set(medicine_ids)
+        if not medicine_ids:
+            return
+        month = month_start(since)
+        while month < until:
+            for log in self.read_month(month, user_id):
+                if log.medicine_id in medicine_ids and since <= log.created_at < until:
+                    yield log
+            month = next_month(month)
+
+
+log_archive = MedicineLogArchive(
+    os.getenv("MEDICINE_LOG_ARCHIVE_DIR", "archive/medicine_logs"),
+    hot_months=int(os.getenv("MEDICINE_LOG_HOT_MONTHS", 3))
+)
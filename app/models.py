@@ -1,21 +1,33 @@
 from app.config import db
 import uuid
 from datetime import datetime, timedelta
-import json
 from sqlalchemy.sql import func
 from sqlalchemy import DateTime
+from sqlalchemy.dialects import mysql, sqlite
 
 
 # Function to generate unique UUIDs
 def generate_uuid():
     return str(uuid.uuid4())
 
+# Convert an "HH:MM" time string to minutes since midnight (ValueError if it is not a time of day)
+def time_to_minute(time_str):
+    hours, minutes = (int(part) for part in time_str.split(":"))
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time {time_str!r}, expected HH:MM")
+    return hours * 60 + minutes
+
+# Convert minutes since midnight back to an "HH:MM" time string
+def minute_to_time(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
 # User model (Account holder)
 class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # Long enough for scrypt hashes
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped by every write, feeds the ETags
     created_at = db.Column(DateTime(), default=func.now())
     updated_at = db.Column(DateTime(), onupdate=func.now())
 
@@ -25,7 +37,7 @@ class User(db.Model):
 # Patient model (Grandparent/Parent)
 class Patient(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=False)
     phone = db.Column(db.String(100), nullable=True)
@@ -39,23 +51,31 @@ class Patient(db.Model):
 class Course(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     name = db.Column(db.String(100), nullable=False)
-    patient_id = db.Column(db.String(36), db.ForeignKey('patient.id'), nullable=False)
+    patient_id = db.Column(db.String(36), db.ForeignKey('patient.id'), nullable=False, index=True)
+    expires_at = db.Column(DateTime(), nullable=True, index=True)  # Latest medicine expiry, see refresh_course_expiry
+    active = db.Column(db.Boolean, nullable=False, default=True, server_default='1')  # Cleared by the expiry sweeper
     created_at = db.Column(DateTime(), default=func.now())
     updated_at = db.Column(DateTime(), onupdate=func.now())
 
     # Relationship with medicines
     medicines = db.relationship("Medicine", backref="course", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index('ix_course_patient_expires', 'patient_id', 'expires_at'),
+        db.Index('ix_course_patient_active', 'patient_id', 'active'),
+        db.Index('ix_course_active_expires', 'active', 'expires_at'),
+    )
     
     @property
     def course_expiry(self):
         """Returns the latest expiry date among all medicines in the course."""
-        latest_medicine = max(self.medicines, key=lambda med: med.expiry_at, default=None)
-        return latest_medicine.expiry_at if latest_medicine else None
+        return self.expires_at
     
     @property
     def is_expired(self):
         """Check if the course has expired based on the latest medicine expiry date."""
-        return self.course_expiry and self.course_expiry < datetime.utcnow()
+        course_expiry = self.course_expiry
+        return course_expiry and course_expiry < datetime.utcnow()
 
 # Medicine model
 class Medicine(db.Model):
@@ -63,22 +83,36 @@ class Medicine(db.Model):
     course_id = db.Column(db.String(36), db.ForeignKey('course.id'), nullable=False)  # Fixed FK
     name = db.Column(db.String(100), nullable=False)
     duration = db.Column(db.Integer, nullable=False)  # Duration in days
-    times = db.Column(db.String(500), nullable=False)  # Store multiple times as JSON string
     created_at = db.Column(DateTime(), default=func.now())
     updated_at = db.Column(DateTime(), onupdate=func.now())
-    expiry_at = db.Column(DateTime(), nullable=False)  # Calculated based on duration
+    expiry_at = db.Column(DateTime(), nullable=False, index=True)  # Calculated based on duration
+    active = db.Column(db.Boolean, nullable=False, default=True, server_default='1')  # Cleared by the expiry sweeper
 
     logs = db.relationship("MedicineLog", backref="medicine", cascade="all, delete-orphan")
+    # Dose times are stored as one DoseSlot row per minute of the day
+    dose_slots = db.relationship(
+        "DoseSlot", backref="medicine", cascade="all, delete-orphan", order_by="DoseSlot.minute_of_day"
+    )
+    adherence = db.relationship("AdherenceDaily", backref="medicine", cascade="all, delete-orphan")
 
         
     def set_times(self, times_list):
-        """Store list of times as a JSON string"""
-        self.times = json.dumps(times_list)
+        """Store list of "HH:MM" times as dose slots"""
+        self.dose_slots = [
+            DoseSlot(minute_of_day=minute, expiry_at=self.expiry_at)
+            for minute in dict.fromkeys(time_to_minute(t) for t in times_list)
+        ]
 
     def get_times(self):
-        """Retrieve list of times as a Python list"""
-        return json.loads(self.times) if self.times else []
+        """Retrieve list of "HH:MM" times from the dose slots"""
+        return [minute_to_time(slot.minute_of_day) for slot in self.dose_slots]
     
+    # Serves course_id lookups and the latest expiry of a course from the index alone
+    __table_args__ = (
+        db.Index('ix_medicine_course_expiry', 'course_id', 'expiry_at'),
+        db.Index('ix_medicine_active_expiry', 'active', 'expiry_at'),
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Ensure duration is set before using it
@@ -99,4 +133,186 @@ class MedicineLog(db.Model):
     created_at = db.Column(DateTime(), default=func.now()) 
     updated_at = db.Column(DateTime(), onupdate=func.now())
 
-    
\ No newline at end of file
+    # Log pages are keyset ranges of one medicine in (created_at, id) order, read from this index without sorting
+    __table_args__ = (
+        db.Index('ix_medicine_log_medicine_created_id', 'medicine_id', 'created_at', 'id'),
+    )
+
+# Recompute the stored expiry of courses after their medicines changed (one UPDATE)
+def refresh_course_expiry(course_ids):
+    latest_expiry = db.select(func.max(Medicine.expiry_at)) \
+        .where(Medicine.course_id == Course.id) \
+        .scalar_subquery()
+    db.session.query(Course) \
+        .filter(Course.id.in_(course_ids)) \
+        .update({
+            Course.expires_at: latest_expiry,
+            # A course without medicines stays active, like before
+            Course.active: db.case((latest_expiry <= datetime.utcnow(), False), else_=True)
+        }, synchronize_session=False)
+
+# Flag the medicines and courses that expired as inactive (call from the expiry sweeper, then commit).
+# Returns the ids of the retired medicines. The UPDATEs repeat the expiry conditions: a course whose
+# expiry a new medicine pushed out after the SELECT (refresh_course_expiry) must stay active.
+def retire_expired(now):
+    medicines = db.session.query(Medicine.id, Course.patient_id) \
+        .join(Course, Medicine.course_id == Course.id) \
+        .filter(Medicine.active.is_(True), Medicine.expiry_at <= now) \
+        .all()
+    courses = db.session.query(Course.id, Course.patient_id) \
+        .filter(Course.active.is_(True), Course.expires_at <= now) \
+        .all()
+
+    medicine_ids = [medicine.id for medicine in medicines]
+    if medicine_ids:
+        db.session.query(Medicine) \
+            .filter(Medicine.id.in_(medicine_ids), Medicine.active.is_(True), Medicine.expiry_at <= now) \
+            .update({Medicine.active: False}, synchronize_session=False)
+    if courses:
+        db.session.query(Course) \
+            .filter(Course.id.in_([course.id for course in courses]), Course.active.is_(True), Course.expires_at <= now) \
+            .update({Course.active: False}, synchronize_session=False)
+
+    # Listings show the flag, so their ETags must change with it
+    patient_ids = {row.patient_id for row in medicines + courses}
+    if patient_ids:
+        bump_patient_users_version(list(patient_ids))
+    return medicine_ids
+
+# Invalidate the ETags of a user (call in the same transaction as the write)
+def bump_user_version(user_id):
+    db.session.query(User) \
+        .filter(User.id == user_id) \
+        .update({User.data_version: User.data_version + 1}, synchronize_session=False)
+
+# Invalidate the ETags of the users owning the given patients
+def bump_patient_users_version(patient_ids):
+    owners = db.session.query(Patient.user_id).filter(Patient.id.in_(patient_ids))
+    db.session.query(User) \
+        .filter(User.id.in_(owners)) \
+        .update({User.data_version: User.data_version + 1}, synchronize_session=False)
+
+# Dose slot model (one row per medicine per dose time, also used by the scheduler)
+class DoseSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    medicine_id = db.Column(db.String(36), db.ForeignKey('medicine.id'), nullable=False, index=True)
+    minute_of_day = db.Column(db.SmallInteger, nullable=False)  # Minutes since 00:00 IST
+    expiry_at = db.Column(DateTime(), nullable=False)  # Copied from the medicine
+
+    __table_args__ = (
+        db.Index('ix_dose_slot_minute_expiry', 'minute_of_day', 'expiry_at'),
+    )
+
+# Journal of medicines whose dose slots were added or removed, polled by the scheduler leader
+# to patch its timing wheel (writes are served by every worker, only the leader's wheel places calls)
+class ScheduleChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    medicine_id = db.Column(db.String(36), nullable=False)  # No foreign key, deleted medicines are recorded too
+    created_at = db.Column(DateTime(), nullable=False, index=True)
+
+# Record that the dose slots of these medicines changed (call in the same transaction as the write)
+def record_schedule_change(medicine_ids):
+    if not medicine_ids:
+        return
+    now = datetime.utcnow()
+    db.session.execute(
+        ScheduleChange.__table__.insert(),
+        [{'medicine_id': medicine_id, 'created_at': now} for medicine_id in medicine_ids]
+    )
+
+# Daily adherence rollup (taken/missed counts per medicine per IST day)
+class AdherenceDaily(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    medicine_id = db.Column(db.String(36), db.ForeignKey('medicine.id'), nullable=False)
+    patient_id = db.Column(db.String(36), db.ForeignKey('patient.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    taken_count = db.Column(db.Integer, nullable=False, default=0)
+    missed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('medicine_id', 'day', name='uq_adherence_daily_medicine_day'),
+        db.Index('ix_adherence_daily_patient_day', 'patient_id', 'day'),
+    )
+
+    @staticmethod
+    def increment(rows):
+        """Add taken/missed counts to the rollup rows, creating them if needed (one upsert statement).
+
+        rows: dicts with medicine_id, patient_id, day, taken_count and missed_count
+        """
+        if not rows:
+            return
+
+        table = AdherenceDaily.__table__
+        if db.session.get_bind().dialect.name == "mysql":
+            stmt = mysql.insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update(
+                taken_count=table.c.taken_count + stmt.inserted.taken_count,
+                missed_count=table.c.missed_count + stmt.inserted.missed_count
+            )
+        else:
+            stmt = sqlite.insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['medicine_id', 'day'],
+                set_={
+                    'taken_count': table.c.taken_count + stmt.excluded.taken_count,
+                    'missed_count': table.c.missed_count + stmt.excluded.missed_count
+                }
+            )
+        db.session.execute(stmt)
+
+# Scheduler lease (the process holding an unexpired lease is the scheduler leader)
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(DateTime(), nullable=False)
+
+# Cluster-wide call rate: the start of the next free call slot (epoch seconds), reserved by every node's dispatcher
+class CallRateLimit(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    next_slot = db.Column(db.Float, nullable=False)
+
+# Scheduler watermark: the last minute (UTC) whose reminders were fully stored
+class SchedulerState(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    processed_until = db.Column(DateTime(), nullable=False)
+
+# Outbox row per reminder call due in a minute, claimed shard by shard by the scheduler nodes
+class ReminderOccurrence(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    medicine_id = db.Column(db.String(36), db.ForeignKey('medicine.id'), nullable=False)
+    patient_id = db.Column(db.String(36), nullable=False)
+    scheduled_at = db.Column(DateTime(), nullable=False)  # UTC, truncated to the minute
+    shard = db.Column(db.SmallInteger, nullable=False)
+    claimed_by = db.Column(db.String(100), nullable=True)
+    claimed_at = db.Column(DateTime(), nullable=True)
+    called_at = db.Column(DateTime(), nullable=True)
+    # Outbox state: pending -> claimed -> sending -> sent, or failed once the attempts run out
+    status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = db.Column(DateTime(), nullable=False)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('medicine_id', 'scheduled_at', name='uq_reminder_occurrence_medicine_minute'),
+        db.Index('ix_reminder_occurrence_minute_shard', 'scheduled_at', 'shard'),
+        db.Index('ix_reminder_occurrence_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    @staticmethod
+    def insert_missing(rows):
+        """Insert occurrences, skipping the ones already materialized (one statement).
+
+        rows: dicts with medicine_id, patient_id, scheduled_at, shard and the initial outbox state
+        """
+        if not rows:
+            return
+
+        table = ReminderOccurrence.__table__
+        if db.session.get_bind().dialect.name == "mysql":
+            stmt = mysql.insert(table).values(rows).prefix_with("IGNORE")
+        else:
+            stmt = sqlite.insert(table).values(rows).on_conflict_do_nothing(
+                index_elements=['medicine_id', 'scheduled_at']
+            )
+        db.session.execute(stmt)
@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+import multiprocessing
+import os
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash scheme for new passwords: "pbkdf2:sha256" (default) or the memory-hard "scrypt"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
+
+class HashingBusy(Exception):
+    """Raised when too many hashing jobs are already waiting for the pool, or one did not finish in time."""
+
+
+class PasswordHasher:
+    """Runs password hashing in a bounded process pool so request workers are not blocked by it."""
+
+    def __init__(self, method, workers, max_pending, timeout):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None  # Process the pool was created in
+        self._lock = threading.Lock()
+        self._pending = 0  # Jobs queued or running in the pool
+        self._counters = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "timed_out": 0, "max_pending": 0}
+
+    def start(self):
+        """Fork the worker processes now. Call before the process starts any thread (see create_app):
+        children forked later would inherit locks held by those threads and could deadlock."""
+        with self._lock:
+            if self._pid == os.getpid() or "fork" not in multiprocessing.get_all_start_methods():
+                return
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("fork")
+            )
+            self._pid = os.getpid()
+        # A fork pool starts all its processes on the first job
+        self._executor.submit(os.getpid).result()
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        password_hash = self._run(generate_password_hash, password, self.method)
+        self._count("hashed")
+        return password_hash
+
+    def verify(self, password_hash, password):
+        """Check a password. Returns (is_valid, new_hash) where new_hash is set if it was rehashed."""
+        is_valid = self._run(check_password_hash, password_hash, password)
+        self._count("verified")
+
+        # Transparently move old hashes (e.g. pbkdf2:sha256) to the configured method
+        if is_valid and not password_hash.startswith(self.method):
+            self._count("rehashed")
+            return True, self.hash(password)
+        return is_valid, None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=self._pending, workers=self.workers, method=self.method)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise HashingBusy("Too many password hashing requests waiting")
+            self._pending += 1
+            self._counters["max_pending"] = max(self._counters["max_pending"], self._pending)
+
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        # A job that timed out still occupies a worker, it stays pending until it really finishes
+        future.add_done_callback(self._done)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # Only stops it if it has not started yet
+            self._count("timed_out")
+            raise HashingBusy("Password hashing timed out")
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Not started before the threads in this process (or inherited from a parent that was):
+                # forking now is unsafe, and hashlib releases the GIL so threads still scale
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_METHOD,
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32)),
+    timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+)
@@ -0,0 +1,132 @@
+from collections import OrderedDict, namedtuple
+import json
+import os
+import threading
+import time
+from sqlalchemy import event
+from app.models import User
+
+# Lightweight snapshot of an authenticated user handed to the protected routes
+Principal = namedtuple("Principal", ["id", "name", "email"])
+
+
+class PrincipalCache:
+    """Base class keeping the hit/miss counters shared by the cache backends."""
+
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        principal = self._get(user_id)
+        with self._counter_lock:
+            if principal is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return principal
+
+    def put(self, user):
+        """Cache a User and return its Principal"""
+        principal = Principal(user.id, user.name, user.email)
+        self._set(principal)
+        return principal
+
+    def stats(self):
+        with self._counter_lock:
+            return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+class MemoryPrincipalCache(PrincipalCache):
+    """In-process LRU cache with a time to live.
+
+    Each worker process has its own copy, so a change made through another worker
+    is only seen once the entry expires.
+    """
+    backend = "memory"
+
+    def __init__(self, ttl=300, max_size=10000):
+        super().__init__()
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, principal)
+        self._lock = threading.Lock()
+
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _set(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class RedisPrincipalCache(PrincipalCache):
+    """Cache stored in a Redis compatible server, shared by all workers.
+
+    Backend errors are treated as cache misses so auth keeps working without it.
+    """
+    backend = "redis"
+
+    def __init__(self, url, ttl=300):
+        super().__init__()
+        import redis  # Optional dependency, only needed for this backend
+
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, user_id):
+        return f"medify:principal:{user_id}"
+
+    def _get(self, user_id):
+        try:
+            raw = self._redis.get(self._key(user_id))
+        except Exception as e:
+            print(f"[DEBUG] Principal cache read failed: {e}")
+            return None
+        return Principal(*json.loads(raw)) if raw else None
+
+    def _set(self, principal):
+        try:
+            self._redis.setex(self._key(principal.id), self.ttl, json.dumps(list(principal)))
+        except Exception as e:
+            print(f"[DEBUG] Principal cache write failed: {e}")
+
+    def invalidate(self, user_id):
+        try:
+            self._redis.delete(self._key(user_id))
+        except Exception as e:
+            print(f"[DEBUG] Principal cache invalidation failed: {e}")
+
+
+def create_principal_cache():
+    """Build the cache backend selected by PRINCIPAL_CACHE_BACKEND (memory or redis)"""
+    ttl = int(os.getenv("PRINCIPAL_CACHE_TTL", 300))
+    if os.getenv("PRINCIPAL_CACHE_BACKEND", "memory") == "redis":
+        return RedisPrincipalCache(os.getenv("PRINCIPAL_CACHE_URL", "redis://localhost:6379/0"), ttl=ttl)
+    return MemoryPrincipalCache(ttl=ttl, max_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)))
+
+
+principal_cache = create_principal_cache()
+
+
+# Drop cached principals when the user row changes or is deleted
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_principal(mapper, connection, target):
+    principal_cache.invalidate(target.id)
@@ -0,0 +1,157 @@
+from collections import defaultdict
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from app.config import db
+
+# Fraction of requests run under cProfile, and how slow one must be for its profile to be kept
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.01))
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 1.0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Bearer token Prometheus must send for /metrics (scheduler and pool internals), /metrics is off without it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+class EndpointMetrics:
+    """Per-endpoint request counters: wall time, SQL statements, SQL time and rows."""
+
+    fields = ("requests", "errors", "wall_seconds", "sql_statements", "sql_seconds", "sql_rows", "profiles")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+        self._max_wall = defaultdict(float)
+
+    def record(self, endpoint, wall, status, sql_statements, sql_seconds, sql_rows, profiled):
+        with self._lock:
+            counters = self._endpoints[endpoint]
+            counters["requests"] += 1
+            counters["errors"] += status >= 500
+            counters["wall_seconds"] += wall
+            counters["sql_statements"] += sql_statements
+            counters["sql_seconds"] += sql_seconds
+            counters["sql_rows"] += sql_rows
+            counters["profiles"] += profiled
+            self._max_wall[endpoint] = max(self._max_wall[endpoint], wall)
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: dict(counters, max_wall_seconds=self._max_wall[endpoint])
+                for endpoint, counters in self._endpoints.items()
+            }
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def init_profiling(app):
+    """Register the request/SQL instrumentation and the /metrics endpoint on the app"""
+    with app.app_context():
+        engine = db.engine
+
+    # The start time lives on the statement's execution context: a statement that raises never reaches
+    # after_cursor_execute, and a per-connection stack would then pair later statements with its start
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        # Statements of the scheduler and other background threads are not tied to a request
+        if has_request_context() and "profile_started" in g:
+            g.sql_statements += 1
+            g.sql_seconds += elapsed
+            g.sql_rows += max(cursor.rowcount, 0)  # As reported by the driver (-1 when it does not know)
+
+    @app.before_request
+    def start_profile():
+        g.profile_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+        g.sql_rows = 0
+        g.status_code = 500
+        g.profiler = None
+        if random.random() < PROFILE_SAMPLE_RATE:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def capture_status(response):
+        g.status_code = response.status_code
+        return response
+
+    # Streamed responses are timed until the view returns (stream_with_context tears down twice, only the first counts)
+    @app.teardown_request
+    def finish_profile(error):
+        started = g.pop("profile_started", None)
+        if started is None:
+            return
+        wall = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+
+        profiled = False
+        if g.profiler:
+            g.profiler.disable()
+            if wall >= PROFILE_SLOW_SECONDS:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                path = os.path.join(PROFILE_DIR, f"{endpoint}-{time.time_ns()}.prof")
+                g.profiler.dump_stats(path)
+                profiled = True
+                print(f"[DEBUG] Slow request to {endpoint} ({wall:.3f}s), profile written to {path}")
+
+        status = 500 if error else g.status_code
+        endpoint_metrics.record(endpoint, wall, status, g.sql_statements, g.sql_seconds, g.sql_rows, profiled)
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+    print("[DEBUG] Request profiling enabled.")
+    if not METRICS_TOKEN:
+        print("[DEBUG] METRICS_TOKEN is not set, /metrics is disabled.")
+
+
+# Prometheus metrics
+def metrics():
+    from app.principal_cache import principal_cache
+    from app.passwords import password_hasher
+    from app.scheduler.scheduler import leader, dispatcher, tick_metrics, medicine_log_buffer
+
+    if not METRICS_TOKEN:
+        return Response("Not found", status=404)
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return Response("Unauthorized", status=401)
+
+    lines = []
+    for name in EndpointMetrics.fields + ("max_wall_seconds",):
+        kind = "gauge" if name.startswith("max_") else "counter"
+        lines.append(f"# TYPE medify_endpoint_{name} {kind}")
+        for endpoint, counters in sorted(endpoint_metrics.stats().items()):
+            lines.append(f'medify_endpoint_{name}{{endpoint="{endpoint}"}} {counters[name]}')
+
+    components = {
+        "scheduler": {"leader": leader.is_leader()},
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "call_dispatcher": dispatcher.stats(),
+        "medicine_check": tick_metrics.stats(),
+        "medicine_log_buffer": medicine_log_buffer.stats()
+    }
+    for component, stats in components.items():
+        lines.extend(gauge_lines(f"medify_{component}", stats))
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+def gauge_lines(prefix, stats):
+    """Numeric values of a stats dict as gauges (nested dicts are flattened, text values skipped)"""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from gauge_lines(f"{prefix}_{key}", value)
+        elif isinstance(value, (int, float)):
+            yield f"# TYPE {prefix}_{key} gauge"
+            yield f"{prefix}_{key} {float(value)}"
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from app.models import User
 from app.config import db
+from app.principal_cache import principal_cache
 from sqlalchemy.exc import SQLAlchemyError
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import password_hasher, HashingBusy
 import jwt
 import datetime
 from functools import wraps
@@ -17,7 +18,7 @@ auth_bp = Blueprint('auth', __name__)
 
 # Verify auth by token 
 def token_required(f):
-    """Decorator to protect routes with JWT"""
+    """Decorator to protect routes with JWT (passes a cached Principal with id, name and email)"""
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
@@ -27,9 +28,14 @@ def token_required(f):
         token = token.split("Bearer ")[1]  # Extract the actual token from the header
         try:
             data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['user_id']).first()
-            if not current_user:
-                return jsonify({'error': 'Invalid token'}), 401
+
+            # Only hit the database for callers not seen recently
+            current_user = principal_cache.get(data['user_id'])
+            if current_user is None:
+                user = User.query.filter_by(id=data['user_id']).first()
+                if not user:
+                    return jsonify({'error': 'Invalid token'}), 401
+                current_user = principal_cache.put(user)
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token expired'}), 401
         except jwt.InvalidTokenError:
@@ -50,8 +56,8 @@ def register():
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already registered'}), 400
         
-        # Hash password before storing
-        hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+        # Hash password before storing (runs in the hashing pool, not this worker)
+        hashed_password = password_hasher.hash(data['password'])
 
         user = User(
             name=data['name'],
@@ -64,6 +70,9 @@ def register():
 
         return jsonify({'message': 'User created', 'user_id': user.id}), 201
 
+    except HashingBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503
+
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': str(e.__dict__['orig'])}), 500
@@ -81,9 +90,18 @@ def login():
             return jsonify({'error': 'Missing required fields'}), 400
         
         user = User.query.filter_by(email=data['email']).first()
-        if not user or not check_password_hash(user.password, data['password']):
+        if not user:
+            return jsonify({'error': 'Invalid login credentials'}), 401
+
+        is_valid, new_hash = password_hasher.verify(user.password, data['password'])
+        if not is_valid:
             return jsonify({'error': 'Invalid login credentials'}), 401
 
+        # Upgrade hashes made with an older method now that we know the password
+        if new_hash:
+            user.password = new_hash
+            db.session.commit()
+
         # Generate JWT Token
         token = jwt.encode({
             'user_id': user.id,
@@ -92,6 +110,9 @@ def login():
 
         return jsonify({'message': 'Logged in successfully', 'token': token, 'id': user.id, 'name': user.name, 'email': user.email}), 200
 
+    except HashingBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503
+
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
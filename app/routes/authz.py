@@ -0,0 +1,103 @@
+from sqlalchemy import exists
+from app.config import db
+from app.models import (
+    Patient, Course, Medicine, MedicineLog, DoseSlot, AdherenceDaily, ReminderOccurrence, record_schedule_change
+)
+
+# Tables whose rows belong to a medicine and must go before it
+MEDICINE_CHILDREN = (MedicineLog, DoseSlot, AdherenceDaily, ReminderOccurrence)
+
+
+# Ownership checks: one joined EXISTS / SELECT each, no lazy loads
+def owns_patient(user_id, patient_id):
+    return db.session.query(
+        exists().where(Patient.id == patient_id, Patient.user_id == user_id)
+    ).scalar()
+
+def owns_course(user_id, course_id):
+    return db.session.query(
+        exists().where(
+            Course.id == course_id,
+            Course.patient_id == Patient.id,
+            Patient.user_id == user_id
+        )
+    ).scalar()
+
+def owned_patient(user_id, patient_id):
+    """Return (id, phone) of the patient if it belongs to the user, else None"""
+    return db.session.query(Patient.id, Patient.phone) \
+        .filter(Patient.id == patient_id, Patient.user_id == user_id) \
+        .first()
+
+def owned_course_patient(user_id, course_id):
+    """Return (id, phone) of the patient of a course if it belongs to the user, else None"""
+    return db.session.query(Patient.id, Patient.phone) \
+        .join(Course, Course.patient_id == Patient.id) \
+        .filter(Course.id == course_id, Patient.user_id == user_id) \
+        .first()
+
+def owned_medicine_ids(user_id, patient_id=None, course_id=None, medicine_id=None):
+    """Ids of the user's medicines, narrowed to a patient, course or single medicine"""
+    query = db.session.query(Medicine.id) \
+        .join(Course, Medicine.course_id == Course.id) \
+        .join(Patient, Course.patient_id == Patient.id) \
+        .filter(Patient.user_id == user_id)
+
+    if patient_id:
+        query = query.filter(Patient.id == patient_id)
+    if course_id:
+        query = query.filter(Course.id == course_id)
+    if medicine_id:
+        query = query.filter(Medicine.id == medicine_id)
+
+    return [row.id for row in query]
+
+
+def owned_medicine_course(user_id, medicine_id):
+    """Return the course id of the medicine if it belongs to the user, else None"""
+    return db.session.query(Medicine.course_id) \
+        .join(Course, Medicine.course_id == Course.id) \
+        .join(Patient, Course.patient_id == Patient.id) \
+        .filter(Medicine.id == medicine_id, Patient.user_id == user_id) \
+        .scalar()
+
+
+# Scoped deletes (the ORM cascades would load every child first)
+def delete_medicines(medicine_ids):
+    """Delete medicines and their child rows. Callers must have checked ownership."""
+    if not medicine_ids:
+        return
+
+    for model in MEDICINE_CHILDREN:
+        db.session.query(model).filter(model.medicine_id.in_(medicine_ids)).delete(synchronize_session=False)
+    db.session.query(Medicine).filter(Medicine.id.in_(medicine_ids)).delete(synchronize_session=False)
+    record_schedule_change(medicine_ids)  # So the scheduler leader unschedules them
+
+def delete_owned_course(user_id, course_id):
+    """Delete a course of the user with its medicines. Returns the deleted medicine ids, or None if not found."""
+    rows = db.session.query(Course.id, Medicine.id.label("medicine_id")) \
+        .join(Patient, Course.patient_id == Patient.id) \
+        .outerjoin(Medicine, Medicine.course_id == Course.id) \
+        .filter(Course.id == course_id, Patient.user_id == user_id) \
+        .all()
+    if not rows:
+        return None
+
+    medicine_ids = [row.medicine_id for row in rows if row.medicine_id]
+    delete_medicines(medicine_ids)
+    db.session.query(Course).filter(Course.id == course_id).delete(synchronize_session=False)
+    return medicine_ids
+
+def delete_owned_patient(user_id, patient_id):
+    """Delete a patient of the user with everything below it. Returns the deleted medicine ids, or None if not found."""
+    medicine_ids = owned_medicine_ids(user_id, patient_id=patient_id)
+    delete_medicines(medicine_ids)
+
+    owned_patients = db.session.query(Patient.id).filter(Patient.id == patient_id, Patient.user_id == user_id)
+    db.session.query(Course).filter(Course.patient_id.in_(owned_patients)) \
+        .delete(synchronize_session=False)
+    deleted = db.session.query(Patient) \
+        .filter(Patient.id == patient_id, Patient.user_id == user_id) \
+        .delete(synchronize_session=False)
+
+    return medicine_ids if deleted else None
@@ -0,0 +1,33 @@
+from flask import request, make_response
+from functools import wraps
+import hashlib
+import os
+import time
+from app.config import db
+from app.models import User
+
+# Time bucket folded into the ETags, so fields derived from the clock (is_expired, status)
+# are refreshed at least this often even when nothing was written
+ETAG_MAX_AGE = int(os.getenv("ETAG_MAX_AGE", 60))
+
+
+def etag_cached(f):
+    """Decorator (below token_required) answering 304 Not Modified when the user's data did not change"""
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        version = db.session.query(User.data_version).filter(User.id == current_user.id).scalar()
+        bucket = int(time.time() // ETAG_MAX_AGE)
+        etag = hashlib.sha1(f"{current_user.id}:{version}:{bucket}:{request.full_path}".encode()).hexdigest()
+
+        # Skip building the payload entirely when the client already has it
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(f(current_user, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return decorated
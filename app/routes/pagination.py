@@ -0,0 +1,73 @@
+import base64
+from datetime import datetime, timezone
+import heapq
+from itertools import islice
+from sqlalchemy import tuple_
+from app.models import MedicineLog
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 query parameter into a naive UTC datetime (None if missing)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_limit(value):
+    """Parse the page size query parameter, clamped to MAX_PAGE_SIZE"""
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def encode_cursor(log):
+    """Opaque cursor pointing after the given log in (created_at, id) order"""
+    raw = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, log_id = raw.split("|", 1)
+    return datetime.fromisoformat(created_at), log_id
+
+
+def filter_log_window(query, since=None, until=None):
+    """Restrict a MedicineLog query to the [since, until) window"""
+    if since:
+        query = query.filter(MedicineLog.created_at >= since)
+    if until:
+        query = query.filter(MedicineLog.created_at < until)
+    return query
+
+
+def paginate_merged_logs(queries, limit, cursor=None):
+    """Return one page of logs (newest first) across several log queries, and the cursor of the next page.
+
+    Uses keyset pagination on (created_at, id): each query (e.g. one per medicine) reads at most
+    limit + 1 rows of its own index range no matter how deep into the history the client is,
+    then the sorted pages are merged, so the database never sorts a whole history.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    pages = [keyset_page(query, limit + 1, after) for query in queries]
+    logs = list(islice(
+        heapq.merge(*pages, key=lambda log: (log.created_at, log.id), reverse=True),
+        limit + 1
+    ))
+
+    next_cursor = encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return logs[:limit], next_cursor
+
+
+def keyset_page(query, limit, after=None):
+    """The first limit logs of a query (newest first) after the (created_at, id) position"""
+    if after:
+        # A row value comparison, so the index range starts at the cursor instead of at the newest log
+        query = query.filter(tuple_(MedicineLog.created_at, MedicineLog.id) < tuple_(*after))
+    return query.order_by(MedicineLog.created_at.desc(), MedicineLog.id.desc()).limit(limit).all()
@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta, timezone
 from app.config import db
-from app.models import Patient, User, Course, Medicine
-import json
+from app.models import (
+    Patient, User, Course, Medicine, DoseSlot, generate_uuid, time_to_minute,
+    refresh_course_expiry, bump_user_version, record_schedule_change
+)
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from app.routes.auth_routes import token_required
+from app.routes.authz import (
+    owns_patient, owns_course, owned_patient, owned_course_patient, owned_medicine_course,
+    delete_medicines, delete_owned_course, delete_owned_patient
+)
+from app.routes.etag import etag_cached
 
 patient_bp = Blueprint('patient', __name__)
 
@@ -36,6 +45,7 @@ def create_patient(current_user):
         )
 
         db.session.add(new_patient)
+        bump_user_version(current_user.id)
         db.session.commit()
 
         return jsonify({'message': 'Patient created successfully', 'patient_id': new_patient.id}), 201
@@ -52,12 +62,14 @@ def remove_patient(current_user, patient_id):
         if not patient_id:
             return jsonify({"error": "Missing patient_id"}), 400
 
-        patient = Patient.query.get(patient_id)
+        # Scoped deletes, only matching rows of the current user
+        medicine_ids = delete_owned_patient(current_user.id, patient_id)
 
-        if not patient or patient.user_id != current_user.id:
+        if medicine_ids is None:
+            db.session.rollback()
             return jsonify({"error": "Patient not found or unauthorized"}), 404
 
-        db.session.delete(patient)
+        bump_user_version(current_user.id)
         db.session.commit()
 
         return jsonify({"message": "Patient deleted successfully"}), 200
@@ -80,33 +92,140 @@ def add_course(current_user, patient_id):
         medicine_duration = data.get("medicine_duration")
         medicine_times = data.get("medicine_times")
 
-        if not medicine_name or not medicine_times:
+        if not course_name or not medicine_name or not medicine_times:
             return jsonify({"error": "Missing required fields"}), 400
 
-        patient = Patient.query.get(patient_id)
+        error = validate_medicine(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        patient = owned_patient(current_user.id, patient_id)
 
-        if not patient or patient.user_id != current_user.id:
+        if not patient:
             return jsonify({"error": "Patient not found or unauthorized"}), 404
 
+        new_medicine = Medicine(
+            name=medicine_name,
+            duration=medicine_duration
+        )
+        new_medicine.set_times(medicine_times)  # Also creates the dose slots for the scheduler
+
         new_course = Course(
             name=course_name,
-            patient_id=patient_id
+            patient_id=patient_id,
+            expires_at=new_medicine.expiry_at,  # Its only medicine
+            medicines=[new_medicine]
         )
 
         db.session.add(new_course)
-        db.session.flush()  # Ensure new_course.id is generated before using it
+        db.session.flush()  # Ensure the ids are generated before using them
+        record_schedule_change([new_medicine.id])  # The scheduler leader picks the new dose slots up from the journal
+        bump_user_version(current_user.id)
+        db.session.commit()
 
-        new_medicine = Medicine(
-            course_id=new_course.id,
-            name=medicine_name,
-            duration=medicine_duration,
-            times=json.dumps(medicine_times)
-        )
+        return jsonify({"message": "Course with medication added successfully"}), 201
 
-        db.session.add(new_medicine)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+# Validate one medicine of a request, returns an error message or None
+def validate_medicine(medicine):
+    if not isinstance(medicine, dict) or not medicine.get("medicine_name"):
+        return "medicine_name is required"
+
+    duration = medicine.get("medicine_duration")
+    if not isinstance(duration, int) or isinstance(duration, bool) or duration <= 0:
+        return "medicine_duration must be a positive number of days"
+
+    times = medicine.get("medicine_times")
+    if not isinstance(times, list) or not times:
+        return "medicine_times must be a non-empty list"
+    for time_str in times:
+        try:
+            datetime.strptime(time_str, "%H:%M")
+        except (TypeError, ValueError):
+            return f"Invalid time {time_str!r}, expected HH:MM"
+
+    return None
+
+# Add several courses with several medicines each in one request and one transaction
+# Body: {"courses": [{"course_name", "medicines": [{"medicine_name", "medicine_duration", "medicine_times"}]}]}
+# or a single course: {"course_name", "medicines": [...]}
+@patient_bp.route("/bulk-add-courses/<string:patient_id>", methods=["POST"])
+@token_required
+def bulk_add_courses(current_user, patient_id):
+    try:
+        data = request.get_json()
+
+        courses = data.get("courses")
+        if courses is None and "medicines" in data:
+            courses = [data]
+
+        if not isinstance(courses, list) or not courses:
+            return jsonify({"error": "Missing required fields"}), 400
+
+        # Validate everything before writing anything
+        for i, course in enumerate(courses):
+            if not isinstance(course, dict) or not isinstance(course.get("course_name"), str) or not course["course_name"].strip():
+                return jsonify({"error": f"courses[{i}]: course_name is required"}), 400
+            if not isinstance(course.get("medicines"), list) or not course["medicines"]:
+                return jsonify({"error": f"courses[{i}]: medicines must be a non-empty list"}), 400
+            for j, medicine in enumerate(course["medicines"]):
+                error = validate_medicine(medicine)
+                if error:
+                    return jsonify({"error": f"courses[{i}].medicines[{j}]: {error}"}), 400
+
+        patient = owned_patient(current_user.id, patient_id)
+
+        if not patient:
+            return jsonify({"error": "Patient not found or unauthorized"}), 404
+
+        now = datetime.utcnow()
+        course_rows, medicine_rows, slot_rows = [], [], []
+        created = []
+
+        for course in courses:
+            course_id = generate_uuid()
+            course_rows.append({
+                "id": course_id,
+                "name": course["course_name"],
+                "patient_id": patient_id,
+                "expires_at": now + timedelta(days=max(m["medicine_duration"] for m in course["medicines"])),
+                "created_at": now
+            })
+            medicine_ids = []
+
+            for medicine in course["medicines"]:
+                medicine_id = generate_uuid()
+                expiry_at = now + timedelta(days=medicine["medicine_duration"])
+                minutes = list(dict.fromkeys(time_to_minute(t) for t in medicine["medicine_times"]))
+
+                medicine_rows.append({
+                    "id": medicine_id,
+                    "course_id": course_id,
+                    "name": medicine["medicine_name"],
+                    "duration": medicine["medicine_duration"],
+                    "created_at": now,
+                    "expiry_at": expiry_at
+                })
+                slot_rows.extend(
+                    {"medicine_id": medicine_id, "minute_of_day": minute, "expiry_at": expiry_at}
+                    for minute in minutes
+                )
+                medicine_ids.append(medicine_id)
+
+            created.append({"id": course_id, "medicine_ids": medicine_ids})
+
+        # One executemany per table, all in a single transaction
+        db.session.execute(insert(Course), course_rows)
+        db.session.execute(insert(Medicine), medicine_rows)
+        db.session.execute(insert(DoseSlot), slot_rows)
+        record_schedule_change([medicine_id for course in created for medicine_id in course["medicine_ids"]])
+        bump_user_version(current_user.id)
         db.session.commit()
 
-        return jsonify({"message": "Course with medication added successfully"}), 201
+        return jsonify({"message": "Courses with medication added successfully", "courses": created}), 201
 
     except Exception as e:
         db.session.rollback()
@@ -117,14 +236,13 @@ def add_course(current_user, patient_id):
 @token_required
 def delete_course(current_user, course_id):
     try:
-        # Find the course by ID
-        course = Course.query.filter_by(id=course_id).first()
-        
-        if not course or course.patient.user_id != current_user.id:
+        # Delete the course with its medicines, scoped to the current user
+        medicine_ids = delete_owned_course(current_user.id, course_id)
+
+        if medicine_ids is None:
             return jsonify({"error": "Course not found or unauthorized"}), 404
 
-        # Delete the course
-        db.session.delete(course)
+        bump_user_version(current_user.id)
         db.session.commit()
 
         return jsonify({"message": "Course deleted successfully"}), 200
@@ -133,17 +251,28 @@ def delete_course(current_user, course_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-# Get all the courses for a patient
+# Get all the courses for a patient (?status=active|expired to filter)
 @patient_bp.route("/get-all-courses/<string:patient_id>", methods=["GET"])
 @token_required
+@etag_cached
 def get_courses(current_user, patient_id):
     try:
-        patient = Patient.query.get(patient_id)
+        status = request.args.get("status")
+        if status not in (None, "active", "expired"):
+            return jsonify({"error": "Invalid status, expected active or expired"}), 400
 
-        if not patient or patient.user_id != current_user.id:
+        if not owns_patient(current_user.id, patient_id):
             return jsonify({"error": "Patient not found or unauthorized"}), 404
 
-        courses = Course.query.filter_by(patient_id=patient_id).all()
+        query = Course.query.filter_by(patient_id=patient_id)
+
+        # Served by the (patient_id, active) index, the expiry sweeper keeps the flag current
+        if status == "active":
+            query = query.filter(Course.active.is_(True))
+        elif status == "expired":
+            query = query.filter(Course.active.is_(False))
+
+        courses = query.all()
 
         if not courses:
             return jsonify({"message": "No courses found"}), 200
@@ -155,7 +284,7 @@ def get_courses(current_user, patient_id):
                 "name": course.name,
                 "started_at": course.created_at.strftime("%Y-%m-%d %H:%M:%S"),
                 "ends_at": course.course_expiry.strftime("%Y-%m-%d %H:%M:%S") if course.course_expiry else None,
-                "status": "Expired" if course.is_expired else "Active",
+                "status": "Active" if course.active else "Expired",
             })
 
         return jsonify(response), 200
@@ -180,19 +309,27 @@ def add_medicine(current_user, course_id):
         if not medicine_name or not medicine_times:
             return jsonify({"error": "Missing required fields"}), 400
 
-        course = Course.query.get(course_id)
+        error = validate_medicine(data)
+        if error:
+            return jsonify({"error": error}), 400
 
-        if not course or course.patient.user_id != current_user.id:
+        patient = owned_course_patient(current_user.id, course_id)
+
+        if not patient:
             return jsonify({"error": "Course not found or unauthorized"}), 404
 
         new_medicine = Medicine(
             course_id=course_id,
             name=medicine_name,
-            duration=medicine_duration,
-            times=json.dumps(medicine_times)
+            duration=medicine_duration
         )
+        new_medicine.set_times(medicine_times)  # Also creates the dose slots for the scheduler
 
         db.session.add(new_medicine)
+        db.session.flush()
+        refresh_course_expiry([course_id])
+        record_schedule_change([new_medicine.id])  # The scheduler leader picks the new dose slots up from the journal
+        bump_user_version(current_user.id)
         db.session.commit()
 
         return jsonify({"message": "Medicine added successfully"}), 201
@@ -206,12 +343,10 @@ def add_medicine(current_user, course_id):
 @token_required
 def get_medicines(current_user, course_id):
     try:
-        course = Course.query.get(course_id)
-
-        if not course or course.patient.user_id != current_user.id:
+        if not owns_course(current_user.id, course_id):
             return jsonify({"error": "Course not found or unauthorized"}), 404
 
-        medicines = Medicine.query.filter_by(course_id=course_id).all()
+        medicines = Medicine.query.options(selectinload(Medicine.dose_slots)).filter_by(course_id=course_id).all()
 
         if not medicines:
             return jsonify({"message": "No medicines found"}), 200
@@ -221,7 +356,7 @@ def get_medicines(current_user, course_id):
             response.append({
                 "id": medicine.id,
                 "name": medicine.name,
-                "times": json.loads(medicine.times)
+                "times": medicine.get_times()
             })
 
         return jsonify(response), 200
@@ -237,12 +372,14 @@ def delete_medicine(current_user, medicine_id):
         if not medicine_id:
             return jsonify({"error": "Missing medicine_id"}), 400
 
-        medicine = Medicine.query.get(medicine_id)
+        course_id = owned_medicine_course(current_user.id, medicine_id)
 
-        if not medicine or medicine.course.patient.user_id != current_user.id:
+        if not course_id:
             return jsonify({"error": "Medicine not found or unauthorized"}), 404
 
-        db.session.delete(medicine)
+        delete_medicines([medicine_id])
+        refresh_course_expiry([course_id])
+        bump_user_version(current_user.id)
         db.session.commit()
 
         return jsonify({"message": "Medicine deleted successfully"}), 200
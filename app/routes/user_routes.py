@@ -1,80 +1,111 @@
-from flask import Blueprint, jsonify, request
-from app.models import Medicine, MedicineLog
+from flask import Blueprint, jsonify, request, Response, stream_with_context, current_app
+from datetime import date, timedelta
+import heapq
+import json
+import math
+import queue
+from sqlalchemy.orm import selectinload
+from app.models import Medicine, MedicineLog, Course, Patient, AdherenceDaily
 from app.config import db
 from app.models import User
 from app.routes.auth_routes import token_required
+from app.routes.authz import owned_medicine_ids
+from app.events import event_bus
+from app.routes.etag import etag_cached
+from app.routes.pagination import parse_datetime, parse_limit, filter_log_window, paginate_merged_logs, encode_cursor, decode_cursor
+from app.log_archive import log_archive
 
 user_bp = Blueprint('user', __name__)
 
+# Stream a JSON object whose last key holds a list of streamed child objects
+def stream_object(fields, children_key, children):
+    dumps = current_app.json.dumps
+    yield dumps(fields, separators=(",", ":"))[:-1] + f',"{children_key}":['
+    for i, child in enumerate(children):
+        if i:
+            yield ','
+        yield from child
+    yield ']}'
+
+def stream_user(user):
+    """Yield the user tree as JSON chunks instead of building the whole payload in memory"""
+    dumps = current_app.json.dumps
+
+    def medicine_chunks(medicine):
+        yield from stream_object({
+            'id': medicine.id,
+            'name': medicine.name,
+            'duration': medicine.duration,
+            'times': medicine.get_times(),
+            'created_at': medicine.created_at,
+            'updated_at': medicine.updated_at,
+            'expiry_at': medicine.expiry_at,
+            'is_expired': not medicine.active
+        }, 'logs', ([dumps({
+            'id': log.id,
+            'is_taken': log.is_taken,
+            'created_at': log.created_at,
+            'updated_at': log.updated_at
+        }, separators=(",", ":"))] for log in medicine.logs))
+
+    def course_chunks(course):
+        yield from stream_object({
+            'id': course.id,
+            'name': course.name,
+            'created_at': course.created_at,
+            'updated_at': course.updated_at,
+            'expiry_at': course.course_expiry,
+            'is_expired': not course.active
+        }, 'medicines', (medicine_chunks(medicine) for medicine in course.medicines))
+
+    def patient_chunks(patient):
+        yield from stream_object({
+            'id': patient.id,
+            'name': patient.name,
+            'age': patient.age,
+            'phone': patient.phone,
+            'created_at': patient.created_at,
+            'updated_at': patient.updated_at
+        }, 'courses', (course_chunks(course) for course in patient.courses))
+
+    yield from stream_object({
+        'id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'created_at': user.created_at,
+        'updated_at': user.updated_at
+    }, 'patients', (patient_chunks(patient) for patient in user.patients))
+
 # Get complete user data
 @user_bp.route('/get-user', methods=['GET'])
 @token_required
+@etag_cached
 def get_user(current_user):
     try:
-        user = User.query.get(current_user.id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        try:
+            since = parse_datetime(request.args.get('since'))
+            until = parse_datetime(request.args.get('until'))
+        except ValueError:
+            return jsonify({'error': 'Invalid since/until, expected ISO 8601 datetime'}), 400
 
-        user_data = {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'created_at': user.created_at,
-            'updated_at': user.updated_at,
-            'patients': []
-        }
+        # Only load the logs inside the requested window
+        logs = Medicine.logs
+        if since:
+            logs = logs.and_(MedicineLog.created_at >= since)
+        if until:
+            logs = logs.and_(MedicineLog.created_at < until)
 
-        for patient in user.patients:
-            patient_data = {
-                'id': patient.id,
-                'name': patient.name,
-                'age': patient.age,
-                'phone': patient.phone,
-                'created_at': patient.created_at,
-                'updated_at': patient.updated_at,
-                'courses': []
-            }
+        # Load the whole tree with one batched query per level instead of one query per node
+        user = User.query.options(
+            selectinload(User.patients)
+            .selectinload(Patient.courses)
+            .selectinload(Course.medicines)
+            .options(selectinload(logs), selectinload(Medicine.dose_slots))
+        ).filter_by(id=current_user.id).first()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
 
-            for course in patient.courses:
-                course_data = {
-                    'id': course.id,
-                    'name': course.name,
-                    'created_at': course.created_at,
-                    'updated_at': course.updated_at,
-                    'expiry_at': course.course_expiry,
-                    'is_expired': course.is_expired,
-                    'medicines': []
-                }
-
-                for medicine in course.medicines:
-                    medicine_data = {
-                        'id': medicine.id,
-                        'name': medicine.name,
-                        'duration': medicine.duration,
-                        'times': medicine.get_times(),
-                        'created_at': medicine.created_at,
-                        'updated_at': medicine.updated_at,
-                        'expiry_at': medicine.expiry_at,
-                        'is_expired': medicine.is_expired(),
-                        'logs': []
-                    }
-
-                    for log in medicine.logs:
-                        log_data = {
-                            'id': log.id,
-                            'is_taken': log.is_taken,
-                            'created_at': log.created_at,
-                            'updated_at': log.updated_at
-                        }
-                        medicine_data['logs'].append(log_data)
-
-                    course_data['medicines'].append(medicine_data)
-
-                patient_data['courses'].append(course_data)
-
-            user_data['patients'].append(patient_data)
-
-        return jsonify(user_data), 200
+        return Response(stream_with_context(stream_user(user)), mimetype='application/json'), 200
 
     except Exception as e:
         db.session.rollback()
@@ -83,6 +114,7 @@ def get_user(current_user):
 #Get all patients for an user
 @user_bp.route('/get-patients', methods=['GET'])
 @token_required
+@etag_cached
 def get_patients(current_user):
     try:
         user = User.query.get(current_user.id)
@@ -106,4 +138,244 @@ def get_patients(current_user):
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def serialize_log(log):
+    return {
+        'id': log.id,
+        'medicine_id': log.medicine_id,
+        'is_taken': log.is_taken,
+        'created_at': log.created_at,
+        'updated_at': log.updated_at
+    }
+
+def logs_page(queries):
+    """Apply the since/until window and cursor of the request to log queries, merged into one page"""
+    try:
+        since = parse_datetime(request.args.get('since'))
+        until = parse_datetime(request.args.get('until'))
+        limit = parse_limit(request.args.get('limit'))
+        queries = [filter_log_window(query, since, until) for query in queries]
+        logs, next_cursor = paginate_merged_logs(queries, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since, until, limit or cursor'}), 400
+
+    return jsonify({
+        'logs': [serialize_log(log) for log in logs],
+        'next_cursor': next_cursor
+    }), 200
+
+# Get the logs of a medicine, newest first (?limit=&cursor=&since=&until=)
+@user_bp.route('/medicine-logs/<string:medicine_id>', methods=['GET'])
+@token_required
+def get_medicine_logs(current_user, medicine_id):
+    try:
+        owned = db.session.query(Medicine.id) \
+            .join(Course, Medicine.course_id == Course.id) \
+            .join(Patient, Course.patient_id == Patient.id) \
+            .filter(Medicine.id == medicine_id, Patient.user_id == current_user.id) \
+            .first()
+        if not owned:
+            return jsonify({'error': 'Medicine not found or unauthorized'}), 404
+
+        return logs_page([MedicineLog.query.filter(MedicineLog.medicine_id == medicine_id)])
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Get the logs of all medicines of a patient, newest first (?limit=&cursor=&since=&until=)
+@user_bp.route('/patient-logs/<string:patient_id>', methods=['GET'])
+@token_required
+def get_patient_logs(current_user, patient_id):
+    try:
+        patient = Patient.query.get(patient_id)
+        if not patient or patient.user_id != current_user.id:
+            return jsonify({'error': 'Patient not found or unauthorized'}), 404
+
+        medicine_ids = db.session.query(Medicine.id) \
+            .join(Course, Medicine.course_id == Course.id) \
+            .filter(Course.patient_id == patient_id)
+
+        # One bounded index range per medicine, merged: an IN over all of them would sort the whole history
+        return logs_page([
+            MedicineLog.query.filter(MedicineLog.medicine_id == medicine_id) for medicine_id, in medicine_ids
+        ])
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Get archived logs (months moved out of the hot table), newest first
+# (?since=&until= required, at most a year apart; ?patient_id=&medicine_id=&limit=&cursor=)
+@user_bp.route('/archived-logs', methods=['GET'])
+@token_required
+def get_archived_logs(current_user):
+    try:
+        try:
+            since = parse_datetime(request.args.get('since'))
+            until = parse_datetime(request.args.get('until'))
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid since, until, limit or cursor'}), 400
+
+        if not since or not until or until <= since or until - since > timedelta(days=366):
+            return jsonify({'error': 'since and until are required and at most a year apart'}), 400
+
+        # Archive files are read on demand, only the user's files of the months of the window are opened.
+        # Only logs of medicines the user still has are returned, deleted ones stay hidden.
+        medicine_ids = owned_medicine_ids(
+            current_user.id,
+            patient_id=request.args.get('patient_id'),
+            medicine_id=request.args.get('medicine_id')
+        )
+        logs = log_archive.read(since, until, current_user.id, medicine_ids)
+        if cursor:
+            logs = (log for log in logs if (log.created_at, log.id) < cursor)
+        logs = heapq.nlargest(limit + 1, logs, key=lambda log: (log.created_at, log.id))
+
+        return jsonify({
+            'logs': [serialize_log(log) for log in logs[:limit]],
+            'next_cursor': encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Get taken/missed counts per patient, per medicine and per day from the daily rollup
+# (?patient_id=&medicine_id=&since=&until= with since/until as inclusive YYYY-MM-DD days)
+@user_bp.route('/adherence', methods=['GET'])
+@token_required
+def get_adherence(current_user):
+    try:
+        try:
+            since = date.fromisoformat(request.args['since']) if request.args.get('since') else None
+            until = date.fromisoformat(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid since/until, expected YYYY-MM-DD'}), 400
+
+        # Ownership follows medicine -> course -> patient; rollup rows whose patient does not own the medicine are ignored
+        query = db.session.query(
+            AdherenceDaily.patient_id,
+            AdherenceDaily.medicine_id,
+            Medicine.name,
+            AdherenceDaily.day,
+            AdherenceDaily.taken_count,
+            AdherenceDaily.missed_count
+        ).join(Medicine, AdherenceDaily.medicine_id == Medicine.id) \
+         .join(Course, (Medicine.course_id == Course.id) & (Course.patient_id == AdherenceDaily.patient_id)) \
+         .join(Patient, Course.patient_id == Patient.id) \
+         .filter(Patient.user_id == current_user.id)
+
+        if request.args.get('patient_id'):
+            query = query.filter(AdherenceDaily.patient_id == request.args['patient_id'])
+        if request.args.get('medicine_id'):
+            query = query.filter(AdherenceDaily.medicine_id == request.args['medicine_id'])
+        if since:
+            query = query.filter(AdherenceDaily.day >= since)
+        if until:
+            query = query.filter(AdherenceDaily.day <= until)
+
+        rows = query.order_by(AdherenceDaily.patient_id, AdherenceDaily.day).all()
+
+        # Roll the per medicine per day rows up to medicine, day and patient totals
+        patients = {}
+        for patient_id, medicine_id, medicine_name, day, taken, missed in rows:
+            patient = patients.setdefault(patient_id, {
+                'id': patient_id, 'taken': 0, 'missed': 0, 'days': {}, 'medicines': {}
+            })
+            patient['taken'] += taken
+            patient['missed'] += missed
+
+            patient_day = patient['days'].setdefault(day, {'day': day.isoformat(), 'taken': 0, 'missed': 0})
+            patient_day['taken'] += taken
+            patient_day['missed'] += missed
+
+            medicine = patient['medicines'].setdefault(medicine_id, {
+                'id': medicine_id, 'name': medicine_name, 'taken': 0, 'missed': 0, 'days': []
+            })
+            medicine['taken'] += taken
+            medicine['missed'] += missed
+            medicine['days'].append({'day': day.isoformat(), 'taken': taken, 'missed': missed})
+
+        response = []
+        for patient in patients.values():
+            patient['days'] = list(patient['days'].values())
+            patient['medicines'] = list(patient['medicines'].values())
+            response.append(patient)
+
+        return jsonify(response), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Push channel: server-sent events for new medicine logs and call outcomes
+# (keeps the connection open, so run gunicorn with threaded or async workers).
+# Every event has an id; on reconnect the browser sends Last-Event-ID and the events missed meanwhile are replayed.
+@user_bp.route('/events', methods=['GET'])
+@token_required
+def stream_events(current_user):
+    try:
+        after = parse_event_id(request.headers.get('Last-Event-ID'))
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    user_id = current_user.id
+    subscriber = event_bus.subscribe(user_id, after)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event_id, message = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                event_type = json.loads(message).get('type', 'message')
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {message}\n\n'
+        finally:
+            event_bus.unsubscribe(user_id, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Long-poll fallback: waits up to ?timeout= seconds (max 55) for events and returns them, each with its event_id.
+# Pass the last event_id seen as ?after= to also get the events published between two polls.
+@user_bp.route('/events/poll', methods=['GET'])
+@token_required
+def poll_events(current_user):
+    try:
+        timeout = float(request.args.get('timeout', 25))
+        after = parse_event_id(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'Invalid timeout or after'}), 400
+    if math.isnan(timeout):
+        return jsonify({'error': 'Invalid timeout'}), 400
+    timeout = max(0.0, min(timeout, 55.0))
+
+    # Give the DB connection back to the pool while waiting
+    db.session.close()
+
+    subscriber = event_bus.subscribe(current_user.id, after)
+    events = []
+    try:
+        events.append(subscriber.get(timeout=timeout))
+        while True:
+            events.append(subscriber.get_nowait())
+    except queue.Empty:
+        pass
+    finally:
+        event_bus.unsubscribe(current_user.id, subscriber)
+
+    return jsonify([dict(json.loads(message), event_id=event_id) for event_id, message in events]), 200
+
+def parse_event_id(value):
+    """Parse the id of the last event a client saw (None if missing)"""
+    return int(value) if value else None
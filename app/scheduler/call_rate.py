@@ -0,0 +1,57 @@
+import time
+from sqlalchemy.exc import IntegrityError
+from app.config import db
+from app.models import CallRateLimit
+from app.scheduler.dispatcher import TokenBucket
+
+
+class SharedRateLimiter:
+    """Calls-per-second cap shared by every scheduler node, kept in a database row.
+
+    Each call reserves the next free slot with one conditional UPDATE (the row lock orders the nodes)
+    and sleeps until it, so the whole cluster places at most `rate` calls per second however many
+    processes dispatch. While the database is unreachable each node falls back to its own bucket.
+    """
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.app = None  # Set by start_scheduler, the dispatcher workers run outside any app context
+        self._fallback = TokenBucket(rate)
+
+    def acquire(self):
+        """Block until this node may place the next call"""
+        try:
+            with self.app.app_context():
+                slot = self.reserve(time.time())
+        except Exception as e:
+            print(f"[DEBUG] Shared call rate unavailable, limiting this node only: {e}")
+            self._fallback.acquire()
+            return
+
+        wait = slot - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self, now):
+        """Reserve the next call slot (in an app context). Returns when it starts, in epoch seconds."""
+        interval = 1 / self.rate
+        free_at = db.case((CallRateLimit.next_slot < now, now), else_=CallRateLimit.next_slot)
+        reserved = db.session.query(CallRateLimit) \
+            .filter(CallRateLimit.name == self.name) \
+            .update({CallRateLimit.next_slot: free_at + interval}, synchronize_session=False)
+
+        if not reserved:
+            # First call: the row does not exist yet
+            db.session.add(CallRateLimit(name=self.name, next_slot=now + interval))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()  # Another node created it first
+                return self.reserve(now)
+            return now
+
+        # Still in our transaction, so this is the value our UPDATE wrote
+        next_slot = db.session.query(CallRateLimit.next_slot).filter(CallRateLimit.name == self.name).scalar()
+        db.session.commit()
+        return next_slot - interval
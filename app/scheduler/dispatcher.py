@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket limiting how many calls are placed per second.
+
+    The default capacity of one token spaces calls 1/rate apart; a larger one allows bursts above the rate.
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CallDispatcher:
+    """Places outbound calls from a bounded queue with a pool of worker threads.
+
+    Calls are spaced by rate_limiter (anything with a blocking acquire()), by default a
+    TokenBucket of calls_per_second for this process only.
+    """
+
+    def __init__(self, client, workers=4, queue_size=1000, calls_per_second=1.0, rate_limiter=None):
+        self.client = client
+        self.workers = workers
+        self.rate_limiter = rate_limiter or TokenBucket(calls_per_second)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "placed": 0, "failed": 0, "dropped": 0, "skipped": 0}
+
+    def start(self):
+        """Start the worker threads (no-op if already running)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"call-dispatcher-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Wait for the queued calls to be placed and stop the workers"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def submit(self, on_result=None, before_call=None, **call_kwargs):
+        """Queue a call for the workers. Returns False if the queue is full.
+
+        before_call runs in the worker right before the call is placed; the call is skipped if it returns False.
+        """
+        try:
+            self._queue.put_nowait((call_kwargs, on_result, before_call))
+        except queue.Full:
+            self._count("dropped")
+            print(f"[DEBUG] Call queue full, dropping call to {call_kwargs.get('to')}")
+            return False
+
+        self._count("submitted")
+        return True
+
+    def stats(self):
+        """Return the dispatcher counters and the current queue depth"""
+        with self._lock:
+            return dict(self._counters, queue_depth=self._queue.qsize())
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            call_kwargs, on_result, before_call = job
+            self.rate_limiter.acquire()
+            try:
+                if before_call and not before_call():
+                    self._count("skipped")
+                    continue
+            except Exception as e:
+                self._count("skipped")
+                print(f"Call to {call_kwargs.get('to')} skipped: {e}")
+                continue
+
+            call, error = None, None
+            try:
+                call = self.client.calls.create(**call_kwargs)
+                self._count("placed")
+                print(f"Call initiated: {call.sid}")
+            except Exception as e:
+                error = e
+                self._count("failed")
+                print(f"Call to {call_kwargs.get('to')} failed: {e}")
+
+            if on_result:
+                try:
+                    on_result(call, error)
+                except Exception as e:
+                    print(f"Call result handler failed: {e}")
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
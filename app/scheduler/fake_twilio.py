@@ -0,0 +1,36 @@
+import itertools
+import threading
+import time
+
+
+class FakeCall:
+    def __init__(self, sid, **kwargs):
+        self.sid = sid
+        self.kwargs = kwargs
+
+
+class FakeCalls:
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.created = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        """Record the call instead of placing it, after simulating the API round trip"""
+        time.sleep(self.latency)
+        with self._lock:
+            n = next(self._ids)
+            if self.fail_every and n % self.fail_every == 0:
+                raise RuntimeError("Simulated Twilio failure")
+            call = FakeCall(f"CAFAKE{n:026d}", **kwargs)
+            self.created.append(call)
+        return call
+
+
+class FakeTwilioClient:
+    """Local stand-in for twilio.rest.Client that records calls instead of placing them."""
+
+    def __init__(self, latency=0.0, fail_every=0):
+        self.calls = FakeCalls(latency=latency, fail_every=fail_every)
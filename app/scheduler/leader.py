@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app.config import db
+from app.models import SchedulerLease
+
+
+class LeaderLease:
+    """Lease row in the database that makes exactly one process the scheduler leader.
+
+    The leader renews the lease on every heartbeat; if it dies the lease expires after
+    `ttl` seconds and the next heartbeat of another process takes it over.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self._pid = None
+        self._node_id = None
+        self._lease_until = None
+
+    @property
+    def node_id(self):
+        # Regenerated after a fork so forked workers never share an identity
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._node_id = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+            self._lease_until = None
+        return self._node_id
+
+    def is_leader(self):
+        """True while this process holds a lease that has not run out"""
+        if self._pid != os.getpid():
+            return False  # Forked after the lease was taken, only the parent holds it
+        return self._lease_until is not None and datetime.utcnow() < self._lease_until
+
+    def heartbeat(self):
+        """Acquire the lease if it is free or expired, or renew it if we hold it. Returns is_leader()."""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.ttl)
+        node_id = self.node_id
+
+        try:
+            renewed = db.session.query(SchedulerLease) \
+                .filter(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.holder == node_id, SchedulerLease.expires_at < now)
+                ) \
+                .update({SchedulerLease.holder: node_id, SchedulerLease.expires_at: lease_until},
+                        synchronize_session=False)
+
+            if not renewed:
+                # First start: the lease row does not exist yet
+                if db.session.query(SchedulerLease.name).filter_by(name=self.name).first():
+                    db.session.rollback()
+                    self._lease_until = None
+                    return False
+                db.session.add(SchedulerLease(name=self.name, holder=node_id, expires_at=lease_until))
+
+            db.session.commit()
+            self._lease_until = lease_until
+        except IntegrityError:
+            db.session.rollback()  # Another process created the row first
+            self._lease_until = None
+        except Exception as e:
+            db.session.rollback()
+            print(f"[DEBUG] Leader heartbeat failed: {e}")
+            # Keep leading until our own lease runs out, the others cannot take it before that
+
+        return self.is_leader()
+
+    def release(self):
+        """Give the lease up so another process takes over without waiting for it to expire"""
+        if not self.is_leader():
+            return
+        db.session.query(SchedulerLease) \
+            .filter(SchedulerLease.name == self.name, SchedulerLease.holder == self.node_id) \
+            .update({SchedulerLease.expires_at: datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        self._lease_until = None
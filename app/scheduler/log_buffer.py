@@ -0,0 +1,198 @@
+from collections import Counter
+import atexit
+import threading
+import time
+import pytz
+from sqlalchemy import insert, text
+from app.config import db
+from app.models import MedicineLog, Medicine, Course, Patient, AdherenceDaily, bump_patient_users_version
+from app.events import event_bus
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+class MedicineLogBuffer:
+    """Write-behind buffer for the IVR keypress logs.
+
+    Rows are flushed as one multi-row insert (with the adherence rollup, ETag versions and
+    events of the whole batch) once max_rows are waiting or max_delay seconds have passed.
+    At most max_pending rows wait, a row failing max_attempts flushes is quarantined (logged and dropped).
+    """
+
+    def __init__(self, max_rows, max_delay, max_pending=10000, max_attempts=3, max_backoff=30):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._rows = []
+        self._failures = Counter()  # Failed flushes per row id
+        self._backoff = 0  # Seconds the flush thread waits between flushes while the database is down
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time (timer thread or shutdown)
+        self._wake = threading.Event()
+        self._app = None
+        self._counters = {
+            "buffered": 0, "flushed": 0, "batches": 0, "dropped": 0, "errors": 0, "overflow": 0, "quarantined": 0
+        }
+
+    def start(self, app):
+        """Start the flush thread (no-op if already running) and flush on shutdown"""
+        with self._lock:
+            if self._app is not None:
+                return
+            self._app = app
+        threading.Thread(target=self._run, name="medicine-log-buffer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, row):
+        """Queue a log row: dict with id, medicine_id, is_taken and created_at (the owners are looked up on write).
+        Returns False if the buffer is full and the row was rejected."""
+        with self._lock:
+            if len(self._rows) >= self.max_pending:
+                self._counters["overflow"] += 1
+                print(f"[DEBUG] Medicine log buffer full, rejecting log {row['id']} of medicine {row['medicine_id']}")
+                return False
+            self._rows.append(row)
+            self._counters["buffered"] += 1
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Write every waiting row now. Rows are put back if the database is unavailable; if the batch fails
+        with the database up, the rows are retried one by one so a bad row cannot hold back the others."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return
+
+            with self._app.app_context():
+                try:
+                    written = self._write(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    with self._lock:
+                        self._counters["errors"] += 1
+                    print(f"[DEBUG] Medicine log flush of {len(rows)} rows failed: {e}")
+                    written = self._write_one_by_one(rows)
+                else:
+                    self._backoff = 0
+                    for row in rows:
+                        self._failures.pop(row['id'], None)
+
+            # Push the new logs to the caregivers' connected clients once they are committed
+            for row in written:
+                event_bus.publish(row['user_id'], {
+                    'type': 'medicine_log',
+                    'id': row['id'],
+                    'patient_id': row['patient_id'],
+                    'medicine_id': row['medicine_id'],
+                    'is_taken': row['is_taken'],
+                    'created_at': row['created_at'].isoformat()
+                })
+
+    def _write_one_by_one(self, rows):
+        """Write rows one at a time after a failed batch. Returns the written rows, keeps the others for a later flush."""
+        written, retry = [], []
+        for index, row in enumerate(rows):
+            try:
+                written.extend(self._write([row]))
+                self._failures.pop(row['id'], None)
+            except Exception as e:
+                db.session.rollback()
+                if not self._database_up():
+                    # Not the row's fault: keep it and everything after it without counting a failure
+                    retry.extend(rows[index:])
+                    self._backoff = min(max(self.max_delay, self._backoff * 2), self.max_backoff)
+                    print(f"[DEBUG] Database unavailable, keeping {len(rows) - index} medicine logs, "
+                          f"retrying in {self._backoff:.2f}s")
+                    break
+                self._failures[row['id']] += 1
+                if self._failures[row['id']] >= self.max_attempts:
+                    del self._failures[row['id']]
+                    with self._lock:
+                        self._counters["quarantined"] += 1
+                    print(f"[DEBUG] Quarantined medicine log after {self.max_attempts} failed flushes: {row} ({e})")
+                else:
+                    retry.append(row)
+        else:
+            self._backoff = 0
+
+        with self._lock:
+            self._rows[:0] = retry
+        return written
+
+    @staticmethod
+    def _database_up():
+        try:
+            db.session.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=len(self._rows))
+
+    def _write(self, rows):
+        # The patient and user always come from the medicine, never from the webhook request.
+        # Logs of medicines deleted while they were waiting (or unknown ones) are dropped.
+        medicine_ids = {row['medicine_id'] for row in rows}
+        owners = {
+            medicine_id: (patient_id, user_id)
+            for medicine_id, patient_id, user_id in db.session.query(Medicine.id, Course.patient_id, Patient.user_id)
+            .join(Course, Medicine.course_id == Course.id)
+            .join(Patient, Course.patient_id == Patient.id)
+            .filter(Medicine.id.in_(medicine_ids))
+        }
+        written = []
+        for row in rows:
+            if row['medicine_id'] in owners:
+                row['patient_id'], row['user_id'] = owners[row['medicine_id']]
+                written.append(row)
+        patient_ids = {row['patient_id'] for row in written}
+
+        if written:
+            db.session.execute(insert(MedicineLog), [{
+                'id': row['id'],
+                'medicine_id': row['medicine_id'],
+                'is_taken': row['is_taken'],
+                'created_at': row['created_at']
+            } for row in written])
+
+            # One adherence upsert row per medicine and day
+            taken, missed = Counter(), Counter()
+            for row in written:
+                key = (row['medicine_id'], row['patient_id'], row['created_at'].replace(tzinfo=pytz.utc).astimezone(IST).date())
+                (taken if row['is_taken'] else missed)[key] += 1
+            AdherenceDaily.increment([{
+                'medicine_id': medicine_id,
+                'patient_id': patient_id,
+                'day': day,
+                'taken_count': taken[(medicine_id, patient_id, day)],
+                'missed_count': missed[(medicine_id, patient_id, day)]
+            } for medicine_id, patient_id, day in taken.keys() | missed.keys()])
+
+            bump_patient_users_version(list(patient_ids))
+            db.session.commit()
+
+        with self._lock:
+            self._counters["flushed"] += len(written)
+            self._counters["dropped"] += len(rows) - len(written)
+            self._counters["batches"] += 1
+        return written
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            if self._backoff:
+                time.sleep(self._backoff)  # The database is down, do not retry on every full buffer
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[DEBUG] Medicine log flush failed: {e}")
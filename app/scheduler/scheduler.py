@@ -1,12 +1,29 @@
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, request, Response, Blueprint
-from app.models import Medicine, Patient, MedicineLog
+from flask import Flask, request, Response, Blueprint, current_app
+from app.models import (
+    Medicine, Patient, DoseSlot, Course, SchedulerState, ScheduleChange, generate_uuid, retire_expired
+)
+from app.scheduler.timing_wheel import timing_wheel, Reminder
+from app.scheduler.dispatcher import CallDispatcher
+from app.scheduler.call_rate import SharedRateLimiter
+from app.scheduler.leader import LeaderLease
+from app.scheduler.shards import ReminderShards
+from app.scheduler.tick_metrics import TickMetrics
+from app.scheduler.log_buffer import MedicineLogBuffer
+from app.scheduler.twiml import (
+    CallContext, CALL_CONTEXT_SECRET, sign_call_context, load_call_context, render_reminder, TAKEN_TWIML, NOT_TAKEN_TWIML
+)
+from app.scheduler.fake_twilio import FakeTwilioClient
+import atexit
 import os
+import threading
+import time
 from twilio.twiml.voice_response import VoiceResponse
 from twilio.rest import Client
 from app.config import db
+from app.events import event_bus
+from app.log_archive import log_archive
 import pytz
 from dotenv import load_dotenv
 
@@ -19,47 +36,323 @@ twilio_bp = Blueprint('twilio', __name__)
 # Twilio credentials
 account_sid = os.getenv("TWILIO_ACCOUNT_SID")
 auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-client = Client(account_sid, auth_token)
+if os.getenv("TWILIO_FAKE"):
+    client = FakeTwilioClient(latency=float(os.getenv("TWILIO_FAKE_LATENCY", 0)))
+else:
+    client = Client(account_sid, auth_token)
 IST = pytz.timezone('Asia/Kolkata')
 
+# Twilio's calls-per-second cap is per account, so every node draws from the same budget
+call_rate_limiter = SharedRateLimiter("twilio_calls", float(os.getenv("TWILIO_CALLS_PER_SECOND", 1)))
+
+# Calls are placed by a pool of workers so one slow Twilio round trip does not hold up the tick
+dispatcher = CallDispatcher(
+    client,
+    workers=int(os.getenv("CALL_DISPATCH_WORKERS", 4)),
+    queue_size=int(os.getenv("CALL_DISPATCH_QUEUE_SIZE", 1000)),
+    rate_limiter=call_rate_limiter
+)
+
+# Only the process holding this lease places reminder calls, the others stand by
+leader = LeaderLease("medicine_checker", ttl=int(os.getenv("LEADER_LEASE_SECONDS", 30)))
+
+# The leader stores each minute's reminders in an outbox; every node claims and calls them shard by shard
+reminder_shards = ReminderShards(
+    shards=int(os.getenv("REMINDER_SHARDS", 16)),
+    claim_timeout=int(os.getenv("REMINDER_CLAIM_TIMEOUT", 120)),
+    grace_minutes=int(os.getenv("REMINDER_GRACE_MINUTES", 10)),
+    max_attempts=int(os.getenv("REMINDER_MAX_ATTEMPTS", 3)),
+    retry_base=int(os.getenv("REMINDER_RETRY_BASE_SECONDS", 30))
+)
+# A node claims no more occurrences than fit in this many queued calls
+REMINDER_MAX_BACKLOG = int(os.getenv("REMINDER_MAX_BACKLOG", 100))
+
+# A tick that is still running makes the next one return at once, the next tick catches up from the watermark
+tick_lock = threading.Lock()
+tick_metrics = TickMetrics()
+
+# Unsigned ?patient_id=&medicine_id= webhooks of calls placed before the signed call context.
+# Off by default, only for draining calls placed by an older deploy; remove after 2026-12-01.
+TWILIO_LEGACY_CALLBACKS = bool(os.getenv("TWILIO_LEGACY_CALLBACKS"))
+
+# Dose slot changes are journaled by whichever worker served the write; the leader re-reads the ones
+# of the lookback window before every tick, which also covers late commits and clock skew between nodes
+SCHEDULE_CHANGE_LOOKBACK = timedelta(seconds=int(os.getenv("SCHEDULE_CHANGE_LOOKBACK_SECONDS", 120)))
+schedule_changes_polled_at = None  # UTC time the leader's wheel is up to date with, None until it is loaded
+
+# Keypress logs are written in batches so a busy minute does not cost one commit per answer
+medicine_log_buffer = MedicineLogBuffer(
+    max_rows=int(os.getenv("MEDICINE_LOG_BATCH_ROWS", 200)),
+    max_delay=float(os.getenv("MEDICINE_LOG_BATCH_MS", 250)) / 1000,
+    max_pending=int(os.getenv("MEDICINE_LOG_MAX_PENDING", 10000)),
+    max_attempts=int(os.getenv("MEDICINE_LOG_MAX_ATTEMPTS", 3))
+)
+
 
 def check_medicine_times():
-    """Check if any medicine time matches the current time and initiate a call."""
+    """Store the reminders of every minute since the last processed one for the nodes to call."""
+    if not leader.is_leader():
+        return
+
+    if not tick_lock.acquire(blocking=False):
+        tick_metrics.skip()
+        print("[DEBUG] Previous medicine check still running, skipping this tick.")
+        return
+
+    started = time.monotonic()
+    try:
+        with scheduler.app.app_context():
+            apply_schedule_changes(datetime.utcnow())
+            tick_at = datetime.utcnow()
+            minutes, reminders = process_due_minutes(tick_at)
+    finally:
+        tick_lock.release()
+
+    elapsed = time.monotonic() - started
+    # Lag behind the clock: how long ago the newest stored minute (the watermark) was due
+    processed_until = tick_at.replace(second=0, microsecond=0)
+    lag = (datetime.utcnow() - processed_until).total_seconds()
+    tick_metrics.record(elapsed, minutes, reminders, lag)
+    print(f"[DEBUG] Medicine check stored {reminders} reminders for {minutes} minutes in {elapsed:.3f}s.")
+
+    # Claim right away rather than waiting for the next drain
+    drain_reminder_outbox()
+
+def process_due_minutes(now_utc):
+    """Materialize the minutes after the watermark up to now (within the grace window). Returns (minutes, reminders)."""
+    current = now_utc.replace(second=0, microsecond=0)
+    state = db.session.get(SchedulerState, "medicine_checker")
+
+    # First run starts now; after downtime, catch up on the minutes still inside the grace window
+    oldest = current - timedelta(minutes=reminder_shards.grace_minutes - 1)
+    scheduled_at = max(state.processed_until + timedelta(minutes=1), oldest) if state else current
+    if state is None:
+        state = SchedulerState(name="medicine_checker", processed_until=current - timedelta(minutes=1))
+        db.session.add(state)
+
+    minutes = reminders = 0
+    while scheduled_at <= current:
+        scheduled_ist = scheduled_at.replace(tzinfo=pytz.utc).astimezone(IST)
+
+        # Get the reminders due this minute for medicines not expired
+        # (the wheel already carries the patient and medicine columns the call needs, so no queries here)
+        due_reminders = timing_wheel.pop_due(scheduled_ist.hour * 60 + scheduled_ist.minute, now_utc)
+
+        # The occurrences and the watermark move together; minutes already stored keep their outbox state
+        reminder_shards.materialize(due_reminders, scheduled_at)
+        state.processed_until = scheduled_at
+        db.session.commit()
+
+        minutes += 1
+        reminders += len(due_reminders)
+        scheduled_at += timedelta(minutes=1)
+
+    return minutes, reminders
+
+def drain_reminder_outbox():
+    """Claim the open reminder shards (as long as our call queue has room) and initiate their calls."""
     now_utc = datetime.utcnow()
-    # Convert utc time to ist
-    now_ist = now_utc.replace(tzinfo=pytz.utc).astimezone(IST)
-    current_time = now_ist.strftime("%H:%M")
+    node_id = leader.node_id
+    # Each node starts from its own shard so they rarely race for the same one
+    offset = reminder_shards.shard_of(node_id)
 
     with scheduler.app.app_context():
-        medicines = Medicine.query.all()
-        for medicine in medicines:
-            if medicine.is_expired():  # Skip expired medicines
-                continue
-            
-            # Get times for mediines not expired
-            times_list = json.loads(medicine.times) if medicine.times else []
-            
-            if current_time in times_list:
+        # Calls still queued here keep their claims, only the ones of dead nodes go stale
+        reminder_shards.renew_claims(node_id, now_utc)
+        released, interrupted, missed = reminder_shards.recover(now_utc)
+        if released or interrupted or missed:
+            print(f"[DEBUG] Reminder outbox recovered: {released} released, {interrupted} interrupted, {missed} missed.")
+
+        open_shards = sorted(
+            reminder_shards.open_shards(now_utc),
+            key=lambda group: (group.scheduled_at, (group.shard - offset) % reminder_shards.shards)
+        )
+
+        for scheduled_at, shard in open_shards:
+            room = REMINDER_MAX_BACKLOG - dispatcher.stats()["queue_depth"]
+            if room <= 0:
+                break  # Leave the remaining shards to the other nodes
+
+            for occurrence_id, reminder in reminder_shards.claim(node_id, scheduled_at, shard, now_utc, limit=room):
                 # Debug twilio call
-                print(f"Calling patient for medicine reminder at {now_ist.date()} {current_time}")
-                
-                patient = Patient.query.get(medicine.course.patient_id)
-                if not patient:
-                    print("Patient not found")
-                    continue
-
-                call = client.calls.create(
-                    url=f"{os.getenv('SERVER_URI')}/twilio/twiml?patient_id={patient.id}&medicine_id={medicine.id}",
+                scheduled_ist = scheduled_at.replace(tzinfo=pytz.utc).astimezone(IST)
+                print(f"Calling patient for medicine reminder at {scheduled_ist.date()} {scheduled_ist.strftime('%H:%M')}")
+
+                submitted = dispatcher.submit(
+                    on_result=publish_call_outcome(reminder, occurrence_id),
+                    before_call=start_sending(occurrence_id, node_id),
+                    url=f"{os.getenv('SERVER_URI')}/twilio/twiml?ctx={call_context(reminder)}",
                     to="+918334066167",
                     from_="+12765799954"
                     # to="+917586914646", //soumik
                     # from_="+15396664952" //soumik
                 )
-                print(f"Call initiated: {call.sid}")
+                if not submitted:
+                    reminder_shards.release(occurrence_id, node_id)
+
+def call_context(reminder):
+    """Signed context of a reminder call, handed back to the webhooks in their URLs."""
+    return sign_call_context(CallContext(reminder.medicine_id, reminder.medicine_name))
+
+def start_sending(occurrence_id, node_id):
+    """Build the dispatcher hook marking the occurrence as sending; the call is skipped if our claim was lost."""
+    def before_call():
+        with scheduler.app.app_context():
+            return reminder_shards.start_sending(occurrence_id, node_id, datetime.utcnow())
+    return before_call
+
+def publish_call_outcome(reminder, occurrence_id):
+    """Build the dispatcher callback recording the call and pushing its outcome to the caregiver's clients."""
+    def on_result(call, error):
+        with scheduler.app.app_context():
+            if error:
+                reminder_shards.mark_failed(occurrence_id, error, datetime.utcnow())
+            else:
+                reminder_shards.mark_sent(occurrence_id, datetime.utcnow())
+
+        event_bus.publish(reminder.user_id, {
+            'type': 'call',
+            'status': 'failed' if error else 'initiated',
+            'patient_id': reminder.patient_id,
+            'medicine_id': reminder.medicine_id,
+            'call_sid': call.sid if call else None
+        })
+    return on_result
+
+def renew_leadership():
+    """Heartbeat of the scheduler lease; loads the timing wheel when this process becomes leader."""
+    with scheduler.app.app_context():
+        was_leader = leader.is_leader()
+        is_leader = leader.heartbeat()
+
+    if is_leader and not was_leader:
+        print(f"[DEBUG] {leader.node_id} is now the scheduler leader.")
+        rebuild_timing_wheel()
+        check_medicine_times()  # Catches up on the minutes missed while no leader was running
+    elif was_leader and not is_leader:
+        print(f"[DEBUG] {leader.node_id} lost the scheduler lease.")
+
+def release_leadership():
+    """Hand the lease over on shutdown instead of letting it expire."""
+    with scheduler.app.app_context():
+        leader.release()
+
+def purge_reminder_occurrences():
+    """Delete the reminder occurrences and schedule changes older than a day."""
+    if not leader.is_leader():
+        return
+
+    before = datetime.utcnow() - timedelta(days=1)
+    with scheduler.app.app_context():
+        deleted = reminder_shards.purge(before)
+        db.session.query(ScheduleChange) \
+            .filter(ScheduleChange.created_at < before) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+    print(f"[DEBUG] Purged {deleted} reminder occurrences.")
+
+def archive_medicine_logs():
+    """Move the medicine logs of the months past the hot window to the archive files."""
+    if not leader.is_leader():
+        return
+
+    with scheduler.app.app_context():
+        moved = log_archive.archive_cold_months(datetime.utcnow())
+    print(f"[DEBUG] Archived {moved} medicine logs.")
+
+def sweep_expired():
+    """Flag the medicines and courses that expired as inactive and drop them from the timing wheel."""
+    if not leader.is_leader():
+        return
+
+    with scheduler.app.app_context():
+        medicine_ids = retire_expired(datetime.utcnow())
+        db.session.commit()
+
+    for medicine_id in medicine_ids:
+        timing_wheel.remove(medicine_id)
+    if medicine_ids:
+        print(f"[DEBUG] Retired {len(medicine_ids)} expired medicines.")
+
+def reminder_rows(now_utc):
+    """Query of the live dose slots as (minute_of_day, *Reminder fields) rows, one joined statement
+    selecting only the columns a call needs."""
+    return db.session.query(
+        DoseSlot.minute_of_day,
+        Medicine.id,
+        Medicine.name,
+        Patient.id,
+        Patient.phone,
+        Patient.user_id,
+        DoseSlot.expiry_at
+    ).join(Medicine, DoseSlot.medicine_id == Medicine.id) \
+     .join(Course, Medicine.course_id == Course.id) \
+     .join(Patient, Course.patient_id == Patient.id) \
+     .filter(Medicine.active.is_(True), DoseSlot.expiry_at > now_utc)
+
+def rebuild_timing_wheel():
+    """Reload the reminder timing wheel from the dose slots in the database."""
+    global schedule_changes_polled_at
+    if not leader.is_leader():
+        return
+
+    now_utc = datetime.utcnow()
+
+    with scheduler.app.app_context():
+        rows = reminder_rows(now_utc).all()
+
+    timing_wheel.load(rows)
+    schedule_changes_polled_at = now_utc
+    print(f"[DEBUG] Timing wheel loaded with {len(timing_wheel)} medicines.")
+
+def apply_schedule_changes(now_utc):
+    """Patch the leader's timing wheel with the medicines journaled since the last poll (in an app context).
+
+    Changed medicines are re-read whole, so applying a change twice is harmless. Returns how many were applied.
+    """
+    global schedule_changes_polled_at
+    if schedule_changes_polled_at is None:
+        return 0  # The wheel is not loaded yet, the rebuild reads everything
+
+    since = schedule_changes_polled_at - SCHEDULE_CHANGE_LOOKBACK
+    medicine_ids = {medicine_id for medicine_id, in db.session.query(ScheduleChange.medicine_id)
+                    .filter(ScheduleChange.created_at > since)
+                    .distinct()}
+    schedule_changes_polled_at = now_utc
+    if not medicine_ids:
+        return 0
+
+    schedules = {}
+    for minute, *fields in reminder_rows(now_utc).filter(Medicine.id.in_(medicine_ids)):
+        reminder = Reminder(*fields)
+        schedules.setdefault(reminder.medicine_id, (reminder, []))[1].append(minute)
+
+    for medicine_id in medicine_ids:
+        if medicine_id not in schedules:
+            timing_wheel.remove(medicine_id)  # Deleted, expired or without slots
+            continue
+        try:
+            timing_wheel.add(*schedules[medicine_id])
+        except ValueError as e:
+            print(f"[DEBUG] Not scheduling medicine {medicine_id}: {e}")
+    return len(medicine_ids)
 
 @twilio_bp.route('/twiml', methods=['POST'])
 def twiml():
     """Generate TwiML dynamically based on medicine and patient details."""
+    ctx = request.args.get("ctx")
+    if ctx:
+        # Everything is in the signed context: no queries, just the pre-rendered template
+        context = load_call_context(ctx)
+        if not context:
+            return Response("Invalid request", status=400)
+
+        action = f"{os.getenv('SERVER_URI')}/twilio/handle_ivr_response?ctx={ctx}"
+        return Response(render_reminder(action, context.medicine_name), mimetype="text/xml")
+
+    # Calls placed before the signed context was added
+    if not TWILIO_LEGACY_CALLBACKS:
+        return Response("Invalid request", status=400)
     patient_id = request.args.get("patient_id")
     medicine_id = request.args.get("medicine_id")
 
@@ -81,41 +374,80 @@ def twiml():
 def handle_response():
     """Handle user keypress and call APIs accordingly."""
     digit_pressed = request.form.get("Digits")
-    patient_id = request.args.get("patient_id")
-    medicine_id = request.args.get("medicine_id")
-
-    response = VoiceResponse()
 
-    if digit_pressed == "1":
-        new_medicine_log = MedicineLog(
-            medicine_id=medicine_id,
-            is_taken=True,
-            created_at=datetime.utcnow()
-        )
-        
-        db.session.add(new_medicine_log)
-        db.session.commit()
-        
-        response.say("Thank you. Your medicine intake has been recorded.")
+    ctx = request.args.get("ctx")
+    if ctx:
+        context = load_call_context(ctx)
+        if not context:
+            return Response("Invalid request", status=400)
+        medicine_id = context.medicine_id
+    elif TWILIO_LEGACY_CALLBACKS:
+        # Calls placed before the signed context was added
+        medicine_id = request.args.get("medicine_id")
     else:
-        new_medicine_log = MedicineLog(
-            medicine_id=medicine_id,
-            is_taken=False,
-            created_at=datetime.utcnow()
-        )
-        
-        db.session.add(new_medicine_log)
-        db.session.commit()
-        response.say("Sorry! We have not received any input. Goodbye!")
+        return Response("Invalid request", status=400)
 
-    return Response(str(response), mimetype="text/xml")
+    is_taken = digit_pressed == "1"
+
+    # The buffer writes the log with its adherence rollup (for the patient owning the medicine)
+    # and pushes it to the caregiver's clients
+    medicine_log_buffer.start(current_app._get_current_object())
+    if not medicine_log_buffer.add({
+        'id': generate_uuid(),
+        'medicine_id': medicine_id,
+        'is_taken': is_taken,
+        'created_at': datetime.utcnow()
+    }):
+        return Response("Service unavailable", status=503)
+
+    return Response(TAKEN_TWIML if is_taken else NOT_TAKEN_TWIML, mimetype="text/xml")
 
 # Initialize the scheduler
 scheduler = BackgroundScheduler()
 
 def start_scheduler(app: Flask):
     """Start the background scheduler with the Flask app context."""
+    if not CALL_CONTEXT_SECRET:
+        raise RuntimeError("CALL_CONTEXT_SECRET must be set: it signs the context in the Twilio webhook URLs")
     scheduler.app = app
-    scheduler.add_job(check_medicine_times, 'cron', second=0, id='medicine_checker', replace_existing=True)
+    call_rate_limiter.app = app
+    dispatcher.start()
+    renew_leadership()  # Also loads the timing wheel and catches up on missed minutes if we are the leader
+    atexit.register(release_leadership)
+    # A late or overlapping tick is coalesced into the next one, which resumes from the watermark
+    scheduler.add_job(
+        check_medicine_times, 'cron', second=0,
+        max_instances=1, coalesce=True,
+        misfire_grace_time=int(os.getenv("MEDICINE_CHECK_MISFIRE_SECONDS", 30)),
+        id='medicine_checker', replace_existing=True
+    )
+    # Every node drains the outbox, so the calls of a minute are spread over the whole cluster
+    scheduler.add_job(
+        drain_reminder_outbox, 'interval',
+        seconds=int(os.getenv("REMINDER_DRAIN_SECONDS", 5)),
+        id='reminder_outbox_drainer', replace_existing=True
+    )
+    scheduler.add_job(purge_reminder_occurrences, 'interval', hours=1, id='reminder_occurrence_purge', replace_existing=True)
+    scheduler.add_job(
+        sweep_expired, 'interval',
+        minutes=int(os.getenv("EXPIRY_SWEEP_MINUTES", 1)),
+        id='expiry_sweeper', replace_existing=True
+    )
+    scheduler.add_job(
+        archive_medicine_logs, 'interval',
+        hours=int(os.getenv("MEDICINE_LOG_ARCHIVE_HOURS", 24)),
+        id='medicine_log_archiver', replace_existing=True
+    )
+    scheduler.add_job(
+        renew_leadership, 'interval',
+        seconds=int(os.getenv("LEADER_HEARTBEAT_SECONDS", 10)),
+        id='leader_heartbeat', replace_existing=True
+    )
+    # Periodically reload the whole wheel as a safety net, changes are applied from the journal on every tick
+    scheduler.add_job(
+        rebuild_timing_wheel, 'interval',
+        minutes=int(os.getenv("TIMING_WHEEL_REBUILD_MINUTES", 15)),
+        id='timing_wheel_rebuild', replace_existing=True
+    )
     scheduler.start()
     print("[DEBUG] Scheduler started successfully.")
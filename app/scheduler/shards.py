@@ -0,0 +1,211 @@
+from datetime import timedelta
+import zlib
+from app.config import db
+from app.models import ReminderOccurrence, Medicine, Patient
+from app.scheduler.timing_wheel import Reminder
+
+
+class ReminderShards:
+    """Outbox of reminder calls, split into patient_id hash shards that scheduler nodes claim atomically.
+
+    The leader materializes the due reminders as reminder_occurrence rows; every node then claims
+    (minute, shard) groups with a conditional UPDATE, only as many rows as its call queue has room for.
+    An occurrence moves pending -> claimed -> sending -> sent, and goes back to pending with a backoff
+    when the call fails.
+    It is marked sending right before Twilio is called and never retried from there, so no
+    reminder is placed twice.
+    """
+
+    def __init__(self, shards, claim_timeout, grace_minutes, max_attempts, retry_base):
+        self.shards = shards
+        self.claim_timeout = claim_timeout  # Seconds before a claim of a dead node is released
+        self.grace_minutes = grace_minutes  # Occurrences older than this are no longer called
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base        # Seconds before the first retry, doubled on every attempt
+
+    def shard_of(self, patient_id):
+        # crc32 is stable across processes, unlike hash() on strings
+        return zlib.crc32(patient_id.encode()) % self.shards
+
+    def materialize(self, reminders, scheduled_at):
+        """Store the reminders due at scheduled_at (UTC minute), in the caller's transaction.
+        Occurrences already stored are kept as they are."""
+        ReminderOccurrence.insert_missing([{
+            'medicine_id': reminder.medicine_id,
+            'patient_id': reminder.patient_id,
+            'scheduled_at': scheduled_at,
+            'shard': self.shard_of(reminder.patient_id),
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': scheduled_at
+        } for reminder in reminders])
+
+    def open_shards(self, now):
+        """(scheduled_at, shard) groups that have occurrences ready to be called"""
+        return db.session.query(ReminderOccurrence.scheduled_at, ReminderOccurrence.shard) \
+            .filter(
+                ReminderOccurrence.status == 'pending',
+                ReminderOccurrence.next_attempt_at <= now,
+                ReminderOccurrence.scheduled_at > now - timedelta(minutes=self.grace_minutes)
+            ) \
+            .distinct() \
+            .all()
+
+    def claim(self, node_id, scheduled_at, shard, now, limit):
+        """Claim up to limit occurrences of a (minute, shard) group.
+        Returns their reminders as (occurrence id, Reminder), empty if another node took them."""
+        claimable = (
+            ReminderOccurrence.scheduled_at == scheduled_at,
+            ReminderOccurrence.shard == shard,
+            ReminderOccurrence.claimed_by.is_(None),
+            ReminderOccurrence.status == 'pending',
+            ReminderOccurrence.next_attempt_at <= now
+        )
+        ids = [occurrence_id for occurrence_id, in db.session.query(ReminderOccurrence.id)
+               .filter(*claimable)
+               .order_by(ReminderOccurrence.id)
+               .limit(limit)]
+        if not ids:
+            return []
+
+        # The conditions are repeated, a node racing us for the same rows claims each of them only once
+        claimed = db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.id.in_(ids), *claimable) \
+            .update({
+                ReminderOccurrence.claimed_by: node_id,
+                ReminderOccurrence.claimed_at: now,
+                ReminderOccurrence.status: 'claimed'
+            }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return []
+
+        rows = db.session.query(
+            ReminderOccurrence.id,
+            Medicine.id,
+            Medicine.name,
+            Patient.id,
+            Patient.phone,
+            Patient.user_id,
+            Medicine.expiry_at
+        ).join(Medicine, ReminderOccurrence.medicine_id == Medicine.id) \
+         .join(Patient, ReminderOccurrence.patient_id == Patient.id) \
+         .filter(
+            ReminderOccurrence.id.in_(ids),
+            ReminderOccurrence.claimed_by == node_id,
+            ReminderOccurrence.status == 'claimed'
+         ) \
+         .all()
+        return [(occurrence_id, Reminder(*fields)) for occurrence_id, *fields in rows]
+
+    def start_sending(self, occurrence_id, node_id, now):
+        """Move a claimed occurrence to sending right before the call. False if the claim was lost."""
+        started = db.session.query(ReminderOccurrence) \
+            .filter(
+                ReminderOccurrence.id == occurrence_id,
+                ReminderOccurrence.claimed_by == node_id,
+                ReminderOccurrence.status == 'claimed'
+            ) \
+            .update({
+                ReminderOccurrence.status: 'sending',
+                ReminderOccurrence.claimed_at: now,  # Restarts the timeout for the call itself
+                ReminderOccurrence.attempts: ReminderOccurrence.attempts + 1
+            }, synchronize_session=False)
+        db.session.commit()
+        return bool(started)
+
+    def mark_sent(self, occurrence_id, now):
+        db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.id == occurrence_id) \
+            .update({ReminderOccurrence.status: 'sent', ReminderOccurrence.called_at: now},
+                    synchronize_session=False)
+        db.session.commit()
+
+    def mark_failed(self, occurrence_id, error, now):
+        """Schedule a retry with exponential backoff, or give up after max_attempts"""
+        attempts = db.session.query(ReminderOccurrence.attempts).filter_by(id=occurrence_id).scalar() or 0
+        if attempts < self.max_attempts:
+            changes = {
+                ReminderOccurrence.status: 'pending',
+                ReminderOccurrence.claimed_by: None,
+                ReminderOccurrence.claimed_at: None,
+                ReminderOccurrence.next_attempt_at: now + timedelta(seconds=self.retry_base * 2 ** max(attempts - 1, 0))
+            }
+        else:
+            changes = {ReminderOccurrence.status: 'failed'}
+
+        changes[ReminderOccurrence.last_error] = str(error)[:255]
+        db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.id == occurrence_id) \
+            .update(changes, synchronize_session=False)
+        db.session.commit()
+
+    def release(self, occurrence_id, node_id):
+        """Give a claimed occurrence back without calling (e.g. our call queue is full)"""
+        db.session.query(ReminderOccurrence) \
+            .filter(
+                ReminderOccurrence.id == occurrence_id,
+                ReminderOccurrence.claimed_by == node_id,
+                ReminderOccurrence.status == 'claimed'
+            ) \
+            .update({
+                ReminderOccurrence.status: 'pending',
+                ReminderOccurrence.claimed_by: None,
+                ReminderOccurrence.claimed_at: None
+            }, synchronize_session=False)
+        db.session.commit()
+
+    def renew_claims(self, node_id, now):
+        """Keep the claims of calls still waiting in a live node's queue from being released as stale.
+        Occurrences past the grace window are left to lapse. Returns how many were renewed."""
+        renewed = db.session.query(ReminderOccurrence) \
+            .filter(
+                ReminderOccurrence.claimed_by == node_id,
+                ReminderOccurrence.status == 'claimed',
+                ReminderOccurrence.scheduled_at > now - timedelta(minutes=self.grace_minutes)
+            ) \
+            .update({ReminderOccurrence.claimed_at: now}, synchronize_session=False)
+        db.session.commit()
+        return renewed
+
+    def recover(self, now):
+        """Clean up after nodes that died mid-minute. Returns (released, interrupted, missed) counts."""
+        stale = now - timedelta(seconds=self.claim_timeout)
+
+        # Claimed but never started: safe to hand to another node
+        released = db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.status == 'claimed', ReminderOccurrence.claimed_at < stale) \
+            .update({
+                ReminderOccurrence.status: 'pending',
+                ReminderOccurrence.claimed_by: None,
+                ReminderOccurrence.claimed_at: None
+            }, synchronize_session=False)
+
+        # The call may have been placed before the node died, so it is not retried
+        interrupted = db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.status == 'sending', ReminderOccurrence.claimed_at < stale) \
+            .update({
+                ReminderOccurrence.status: 'failed',
+                ReminderOccurrence.last_error: 'Interrupted while sending'
+            }, synchronize_session=False)
+
+        missed = db.session.query(ReminderOccurrence) \
+            .filter(
+                ReminderOccurrence.status == 'pending',
+                ReminderOccurrence.scheduled_at <= now - timedelta(minutes=self.grace_minutes)
+            ) \
+            .update({
+                ReminderOccurrence.status: 'failed',
+                ReminderOccurrence.last_error: 'Not called within the grace window'
+            }, synchronize_session=False)
+
+        db.session.commit()
+        return released, interrupted, missed
+
+    def purge(self, before):
+        """Delete the occurrences scheduled before the given time"""
+        deleted = db.session.query(ReminderOccurrence) \
+            .filter(ReminderOccurrence.scheduled_at < before) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
@@ -0,0 +1,41 @@
+import threading
+
+
+class TickMetrics:
+    """Timing of the medicine_checker ticks, to see how close they get to the one minute budget."""
+
+    def __init__(self, budget=60.0):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._counters = {
+            "ticks": 0, "skipped": 0, "overruns": 0, "minutes": 0, "reminders": 0,
+            "total_seconds": 0.0, "max_seconds": 0.0
+        }
+        self._last = {}
+
+    def record(self, seconds, minutes, reminders, lag_seconds):
+        """Record a finished tick: its duration, minutes processed, reminders stored and the lag behind the clock"""
+        with self._lock:
+            self._counters["ticks"] += 1
+            self._counters["minutes"] += minutes
+            self._counters["reminders"] += reminders
+            self._counters["total_seconds"] += seconds
+            self._counters["max_seconds"] = max(self._counters["max_seconds"], seconds)
+            if seconds > self.budget:
+                self._counters["overruns"] += 1
+            self._last = {"seconds": seconds, "minutes": minutes, "reminders": reminders, "lag_seconds": lag_seconds}
+
+    def skip(self):
+        """Record a tick that did not run because the previous one was still going"""
+        with self._lock:
+            self._counters["skipped"] += 1
+
+    def stats(self):
+        with self._lock:
+            ticks = self._counters["ticks"]
+            return dict(
+                self._counters,
+                budget_seconds=self.budget,
+                avg_seconds=self._counters["total_seconds"] / ticks if ticks else 0.0,
+                last=dict(self._last)
+            )
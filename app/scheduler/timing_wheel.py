@@ -0,0 +1,69 @@
+from collections import namedtuple
+import threading
+
+MINUTES_PER_DAY = 1440
+
+# Compact entry kept in the wheel for every scheduled medicine
+Reminder = namedtuple("Reminder", ["medicine_id", "medicine_name", "patient_id", "phone", "user_id", "expiry_at"])
+
+
+class TimingWheel:
+    """In-process wheel of 1440 minute buckets holding the reminders due in each minute of the day."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = [dict() for _ in range(MINUTES_PER_DAY)]
+        self._minutes = {}  # medicine_id -> minutes the medicine is scheduled in
+
+    def load(self, rows):
+        """Replace the wheel contents with (minute_of_day, *Reminder fields) rows. Rows outside the day are skipped."""
+        buckets = [dict() for _ in range(MINUTES_PER_DAY)]
+        minutes = {}
+        for minute, *fields in rows:
+            reminder = Reminder(*fields)
+            if not 0 <= minute < MINUTES_PER_DAY:
+                print(f"[DEBUG] Skipping dose slot of medicine {reminder.medicine_id} at invalid minute {minute}")
+                continue
+            buckets[minute][reminder.medicine_id] = reminder
+            minutes.setdefault(reminder.medicine_id, []).append(minute)
+
+        with self._lock:
+            self._buckets = buckets
+            self._minutes = minutes
+
+    def add(self, reminder, minutes):
+        """Schedule (or reschedule) a medicine in the given minutes of the day (ValueError if one is outside the day)"""
+        minutes = list(minutes)
+        invalid = [minute for minute in minutes if not 0 <= minute < MINUTES_PER_DAY]
+        if invalid:
+            raise ValueError(f"Invalid minutes of the day {invalid} for medicine {reminder.medicine_id}")
+
+        with self._lock:
+            self._remove(reminder.medicine_id)
+            for minute in minutes:
+                self._buckets[minute][reminder.medicine_id] = reminder
+            self._minutes[reminder.medicine_id] = list(minutes)
+
+    def remove(self, medicine_id):
+        """Remove a medicine from every bucket it is scheduled in"""
+        with self._lock:
+            self._remove(medicine_id)
+
+    def pop_due(self, minute, now):
+        """Return the live reminders of a minute, dropping the expired medicines from the wheel"""
+        with self._lock:
+            bucket = self._buckets[minute]
+            expired = [medicine_id for medicine_id, reminder in bucket.items() if reminder.expiry_at <= now]
+            for medicine_id in expired:
+                self._remove(medicine_id)
+            return list(bucket.values())
+
+    def __len__(self):
+        return len(self._minutes)
+
+    def _remove(self, medicine_id):
+        for minute in self._minutes.pop(medicine_id, ()):
+            self._buckets[minute].pop(medicine_id, None)
+
+
+timing_wheel = TimingWheel()
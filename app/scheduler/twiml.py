@@ -0,0 +1,50 @@
+from collections import namedtuple
+from xml.sax.saxutils import escape
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+import os
+
+# What the webhooks need about a call, signed into its URL so they do not read the database.
+# The URL is signed, not encrypted: it carries no patient or user ids, only the medicine and its name.
+CallContext = namedtuple("CallContext", ["medicine_id", "medicine_name"])
+
+CALL_CONTEXT_SECRET = os.getenv("CALL_CONTEXT_SECRET")
+# Twilio calls the webhooks while the call is up, older contexts are rejected
+CALL_CONTEXT_MAX_AGE = int(os.getenv("CALL_CONTEXT_MAX_AGE_SECONDS", 3600))
+
+_serializer = URLSafeTimedSerializer(CALL_CONTEXT_SECRET, salt="twilio-call-context") if CALL_CONTEXT_SECRET else None
+
+
+def sign_call_context(context):
+    if _serializer is None:
+        raise RuntimeError("CALL_CONTEXT_SECRET is not set")
+    return _serializer.dumps(list(context))
+
+def load_call_context(token):
+    """Return the CallContext of a signed token, or None if it was tampered with or expired"""
+    if _serializer is None:
+        return None
+    try:
+        return CallContext(*_serializer.loads(token, max_age=CALL_CONTEXT_MAX_AGE))
+    except (BadSignature, TypeError):
+        return None
+
+
+# Pre-rendered TwiML, same markup VoiceResponse builds for these calls
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>'
+
+REMINDER_TEMPLATE = (
+    _XML_HEADER +
+    '<Response><Gather action="{action}" method="POST" numDigits="1">'
+    '<Say>Hello, this is your medicine reminder call. Please take your {medicine_name}. Press 1 to confirm your intake.</Say>'
+    '</Gather><Say>We did not receive any input. Goodbye.</Say></Response>'
+)
+TAKEN_TWIML = _XML_HEADER + '<Response><Say>Thank you. Your medicine intake has been recorded.</Say></Response>'
+NOT_TAKEN_TWIML = _XML_HEADER + '<Response><Say>Sorry! We have not received any input. Goodbye!</Say></Response>'
+
+
+def render_reminder(action, medicine_name):
+    """TwiML asking the patient to confirm the medicine with a keypress"""
+    return REMINDER_TEMPLATE.format(
+        action=escape(action, {'"': "&quot;"}),
+        medicine_name=escape(medicine_name)
+    )
@@ -0,0 +1,82 @@
+"""Twilio webhook benchmark: signed call context vs the legacy ?patient_id=&medicine_id= callbacks.
+
+    python benchmarks/twiml_webhooks.py [requests]
+
+Runs against a throwaway SQLite database with the fake Twilio client, prints the latency
+(mean, p50, p95) and SQL statements per request of both webhooks on each path.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+os.environ["FLASK_CLI"] = "1"
+os.environ["TWILIO_FAKE"] = "1"
+os.environ.setdefault("CALL_CONTEXT_SECRET", "benchmark-call-context-secret")
+os.environ["PROFILE_SAMPLE_RATE"] = "0"
+
+from sqlalchemy import event
+from app.config import create_app, db
+from app.models import User, Patient, Course, Medicine
+from app.scheduler import scheduler
+from app.scheduler.timing_wheel import Reminder
+
+
+def setup(app):
+    with app.app_context():
+        db.create_all()
+        user = User(name="benchmark", email="benchmark@example.test", password="x")
+        db.session.add(user)
+        db.session.flush()
+        medicine = Medicine(name="Paracetamol", duration=5)
+        medicine.set_times(["08:00"])
+        patient = Patient(name="patient", age=70, phone="+910000000000", user_id=user.id)
+        patient.courses = [Course(name="course", medicines=[medicine])]
+        db.session.add(patient)
+        db.session.commit()
+        return patient.id, medicine.id, medicine.name
+
+
+def run(client, url, requests, statements, **kwargs):
+    timings = []
+    statements.clear()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.post(url, **kwargs)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95)] * 1000,
+        "sql_per_request": len(statements) / requests,
+    }
+
+
+def main(requests=2000):
+    app = create_app()
+    patient_id, medicine_id, medicine_name = setup(app)
+    scheduler.TWILIO_LEGACY_CALLBACKS = True
+    ctx = scheduler.call_context(Reminder(medicine_id, medicine_name, patient_id, None, None, None))
+    legacy = f"patient_id={patient_id}&medicine_id={medicine_id}"
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    client = app.test_client()
+
+    for webhook, form in (("twiml", None), ("handle_ivr_response", {"Digits": "1"})):
+        for path, query in (("ctx", f"ctx={ctx}"), ("legacy", legacy)):
+            # The buffered log writes of the previous run must not count as this run's statements
+            scheduler.medicine_log_buffer.flush()
+            result = run(client, f"/twilio/{webhook}?{query}", requests, statements, data=form)
+            print(f"{webhook:<20} {path:<7}" + "".join(f" {key}={value:.3f}" for key, value in result.items()))
+    scheduler.medicine_log_buffer.flush()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
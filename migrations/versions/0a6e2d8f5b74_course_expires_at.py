@@ -0,0 +1,41 @@
+"""course expires at
+
+Revision ID: 0a6e2d8f5b74
+Revises: f19d6b3a4c27
+Create Date: 2026-10-18 14:07:15.930281
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6e2d8f5b74'
+down_revision = 'f19d6b3a4c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_course_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index('ix_course_patient_expires', ['patient_id', 'expires_at'], unique=False)
+
+    # Backfill with the latest expiry of each course's medicines
+    course = sa.table('course', sa.column('id', sa.String), sa.column('expires_at', sa.DateTime))
+    medicine = sa.table('medicine', sa.column('course_id', sa.String), sa.column('expiry_at', sa.DateTime))
+    op.execute(
+        course.update().values(
+            expires_at=sa.select(sa.func.max(medicine.c.expiry_at))
+            .where(medicine.c.course_id == course.c.id)
+            .scalar_subquery()
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_patient_expires')
+        batch_op.drop_index(batch_op.f('ix_course_expires_at'))
+        batch_op.drop_column('expires_at')
@@ -0,0 +1,67 @@
+"""dose slot
+
+Revision ID: 9f3b1c7d2e41
+Revises: 56d15017a0ca
+Create Date: 2026-10-18 10:12:41.220518
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b1c7d2e41'
+down_revision = '56d15017a0ca'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dose_slot = op.create_table('dose_slot',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('medicine_id', sa.String(length=36), nullable=False),
+    sa.Column('minute_of_day', sa.SmallInteger(), nullable=False),
+    sa.Column('expiry_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicine.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('dose_slot', schema=None) as batch_op:
+        batch_op.create_index('ix_dose_slot_minute_expiry', ['minute_of_day', 'expiry_at'], unique=False)
+
+    # Backfill the slots from the JSON encoded times of existing medicines
+    medicine = sa.table('medicine',
+        sa.column('id', sa.String),
+        sa.column('times', sa.String),
+        sa.column('expiry_at', sa.DateTime)
+    )
+    rows = op.get_bind().execute(
+        sa.select(medicine.c.id, medicine.c.times, medicine.c.expiry_at)
+    ).fetchall()
+
+    slots = []
+    for medicine_id, times, expiry_at in rows:
+        minutes = set()
+        for time_str in (json.loads(times) if times else []):
+            # Times were stored unchecked, skip the ones that are not a valid HH:MM
+            try:
+                hours, mins = (int(part) for part in time_str.split(":"))
+            except (AttributeError, ValueError):
+                continue
+            if 0 <= hours < 24 and 0 <= mins < 60:
+                minutes.add(hours * 60 + mins)
+        slots.extend(
+            {'medicine_id': medicine_id, 'minute_of_day': minute, 'expiry_at': expiry_at}
+            for minute in minutes
+        )
+
+    if slots:
+        op.bulk_insert(dose_slot, slots)
+
+
+def downgrade():
+    with op.batch_alter_table('dose_slot', schema=None) as batch_op:
+        batch_op.drop_index('ix_dose_slot_minute_expiry')
+
+    op.drop_table('dose_slot')
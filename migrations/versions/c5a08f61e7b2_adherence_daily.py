@@ -0,0 +1,71 @@
+"""adherence daily
+
+Revision ID: c5a08f61e7b2
+Revises: b27e4a9c8d13
+Create Date: 2026-10-18 11:41:09.372954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import pytz
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a08f61e7b2'
+down_revision = 'b27e4a9c8d13'
+branch_labels = None
+depends_on = None
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+def upgrade():
+    adherence_daily = op.create_table('adherence_daily',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('medicine_id', sa.String(length=36), nullable=False),
+    sa.Column('patient_id', sa.String(length=36), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('taken_count', sa.Integer(), nullable=False),
+    sa.Column('missed_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicine.id'], ),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('medicine_id', 'day', name='uq_adherence_daily_medicine_day')
+    )
+    with op.batch_alter_table('adherence_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_adherence_daily_patient_day', ['patient_id', 'day'], unique=False)
+
+    # Backfill the rollup from the existing logs, bucketed by IST day
+    medicine_log = sa.table('medicine_log',
+        sa.column('medicine_id', sa.String),
+        sa.column('is_taken', sa.Boolean),
+        sa.column('created_at', sa.DateTime)
+    )
+    medicine = sa.table('medicine', sa.column('id', sa.String), sa.column('course_id', sa.String))
+    course = sa.table('course', sa.column('id', sa.String), sa.column('patient_id', sa.String))
+
+    rows = op.get_bind().execute(
+        sa.select(medicine_log.c.medicine_id, course.c.patient_id, medicine_log.c.created_at, medicine_log.c.is_taken)
+        .select_from(medicine_log)
+        .join(medicine, medicine_log.c.medicine_id == medicine.c.id)
+        .join(course, medicine.c.course_id == course.c.id)
+        .where(medicine_log.c.created_at.isnot(None))
+    )
+
+    counts = {}
+    for medicine_id, patient_id, created_at, is_taken in rows:
+        day = created_at.replace(tzinfo=pytz.utc).astimezone(IST).date()
+        row = counts.setdefault((medicine_id, day), {
+            'medicine_id': medicine_id, 'patient_id': patient_id, 'day': day, 'taken_count': 0, 'missed_count': 0
+        })
+        row['taken_count' if is_taken else 'missed_count'] += 1
+
+    if counts:
+        op.bulk_insert(adherence_daily, list(counts.values()))
+
+
+def downgrade():
+    with op.batch_alter_table('adherence_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_adherence_daily_patient_day')
+
+    op.drop_table('adherence_daily')
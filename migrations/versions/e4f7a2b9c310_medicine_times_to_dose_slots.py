@@ -0,0 +1,83 @@
+"""medicine times to dose slots
+
+Revision ID: e4f7a2b9c310
+Revises: d81c3e5f0a96
+Create Date: 2026-10-18 12:58:03.145827
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4f7a2b9c310'
+down_revision = 'd81c3e5f0a96'
+branch_labels = None
+depends_on = None
+
+medicine = sa.table('medicine',
+    sa.column('id', sa.String),
+    sa.column('times', sa.String),
+    sa.column('expiry_at', sa.DateTime)
+)
+dose_slot = sa.table('dose_slot',
+    sa.column('medicine_id', sa.String),
+    sa.column('minute_of_day', sa.SmallInteger),
+    sa.column('expiry_at', sa.DateTime)
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Dose slots become the only storage for times: convert every medicine that has no slots
+    # (e.g. expired ones whose slots were purged by the old scheduler) before dropping the column
+    rows = bind.execute(
+        sa.select(medicine.c.id, medicine.c.times, medicine.c.expiry_at)
+        .where(~sa.exists().where(dose_slot.c.medicine_id == medicine.c.id))
+    ).fetchall()
+
+    slots = []
+    for medicine_id, times, expiry_at in rows:
+        minutes = set()
+        for time_str in (json.loads(times) if times else []):
+            # Times were stored unchecked, skip the ones that are not a valid HH:MM
+            try:
+                hours, mins = (int(part) for part in time_str.split(":"))
+            except (AttributeError, ValueError):
+                continue
+            if 0 <= hours < 24 and 0 <= mins < 60:
+                minutes.add(hours * 60 + mins)
+        slots.extend(
+            {'medicine_id': medicine_id, 'minute_of_day': minute, 'expiry_at': expiry_at}
+            for minute in minutes
+        )
+
+    if slots:
+        op.bulk_insert(dose_slot, slots)
+
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.drop_column('times')
+
+
+def downgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('times', sa.String(length=500), nullable=True))
+
+    # Rebuild the JSON encoded times from the dose slots
+    bind = op.get_bind()
+    times = {}
+    for medicine_id, minute in bind.execute(
+        sa.select(dose_slot.c.medicine_id, dose_slot.c.minute_of_day).order_by(dose_slot.c.minute_of_day)
+    ):
+        times.setdefault(medicine_id, []).append(f"{minute // 60:02d}:{minute % 60:02d}")
+
+    for medicine_id in bind.execute(sa.select(medicine.c.id)).scalars():
+        bind.execute(
+            medicine.update().where(medicine.c.id == medicine_id).values(times=json.dumps(times.get(medicine_id, [])))
+        )
+
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.alter_column('times', existing_type=sa.String(length=500), nullable=False)
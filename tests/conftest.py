@@ -0,0 +1,91 @@
+import itertools
+import os
+import tempfile
+import pytest
+from sqlalchemy import event
+
+# Configure the app before it is imported: SQLite file database, no scheduler jobs, fake Twilio client
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "medify-test.db")
+os.environ["FLASK_CLI"] = "1"
+os.environ["TWILIO_FAKE"] = "1"
+os.environ["CALL_CONTEXT_SECRET"] = "test-call-context-secret"
+
+from app.config import create_app, db
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    from app.scheduler.scheduler import scheduler
+    scheduler.app = app  # The scheduler jobs open their own app context from it
+    return app
+
+
+@pytest.fixture
+def session(app):
+    """Empty tables and an app context for the test"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db.session
+        db.session.remove()
+
+
+@pytest.fixture
+def statements(app):
+    """List collecting the SQL statements executed while the test runs"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def caregiver(session):
+    """A registered user and the Authorization header of a token for it"""
+    import jwt
+    from app.models import User
+    from app.routes.auth_routes import SECRET_KEY
+
+    user = User(name="caregiver", email="caregiver@example.test", password="x")
+    session.add(user)
+    session.commit()
+    token = jwt.encode({"user_id": user.id}, SECRET_KEY, algorithm="HS256")
+    return user, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def add_patient(session):
+    """Factory adding a patient with one course of medicines, for the given user or a new one.
+
+    Returns (user, patient, medicines), committed.
+    """
+    from app.models import User, Patient, Course, Medicine
+    numbers = itertools.count()
+
+    def add(user=None, medicines=("Paracetamol",), times=("08:00",), duration=5):
+        number = next(numbers)
+        if user is None:
+            user = User(name=f"user {number}", email=f"user-{number}@example.test", password="x")
+            session.add(user)
+            session.flush()
+        added = []
+        for name in medicines:
+            medicine = Medicine(name=name, duration=duration)
+            medicine.set_times(list(times))
+            added.append(medicine)
+        patient = Patient(name=f"patient {number}", age=70, phone=f"+91{number:010d}", user_id=user.id)
+        patient.courses = [Course(
+            name=f"course {number}", expires_at=max(medicine.expiry_at for medicine in added), medicines=added
+        )]
+        session.add(patient)
+        session.commit()
+        return user, patient, added
+
+    return add
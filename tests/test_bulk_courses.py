@@ -0,0 +1,62 @@
+import pytest
+from app.models import Patient, Course, Medicine, DoseSlot, ScheduleChange
+
+
+def medicine(name, times=("08:00",), duration=5):
+    return {"medicine_name": name, "medicine_duration": duration, "medicine_times": list(times)}
+
+
+@pytest.fixture
+def patient(session, caregiver):
+    user, headers = caregiver
+    patient = Patient(name="patient", age=70, phone="+910000000000", user_id=user.id)
+    session.add(patient)
+    session.commit()
+    return patient
+
+
+def test_bulk_add_returns_the_created_ids(app, session, caregiver, patient):
+    user, headers = caregiver
+
+    response = app.test_client().post(f"/patient/bulk-add-courses/{patient.id}", headers=headers, json={"courses": [
+        {"course_name": "morning", "medicines": [medicine("Paracetamol"), medicine("Ibuprofen", ("08:00", "20:00"), 10)]},
+        {"course_name": "evening", "medicines": [medicine("Vitamin D", ("21:00",))]}
+    ]})
+
+    assert response.status_code == 201
+    created = response.get_json()["courses"]
+    for course in created:
+        assert sorted(course["medicine_ids"]) == sorted(
+            medicine_id for medicine_id, in session.query(Medicine.id).filter_by(course_id=course["id"])
+        )
+    assert [session.get(Course, course["id"]).name for course in created] == ["morning", "evening"]
+    assert session.query(DoseSlot).count() == 4
+    assert session.query(ScheduleChange).count() == 3  # Journaled for the scheduler leader
+
+
+@pytest.mark.parametrize("courses", [
+    [{"course_name": "valid", "medicines": [medicine("Paracetamol")]}, {"course_name": " ", "medicines": [medicine("Ibuprofen")]}],
+    [{"course_name": "valid", "medicines": [medicine("Paracetamol")]}, {"course_name": "empty", "medicines": []}],
+    [{"course_name": "valid", "medicines": [medicine("Paracetamol"), medicine("Ibuprofen", ("8pm",))]}],
+    [{"course_name": "valid", "medicines": [medicine("Paracetamol"), medicine("Ibuprofen", duration=0)]}],
+])
+def test_bulk_add_writes_nothing_when_any_course_is_invalid(app, session, caregiver, patient, courses):
+    user, headers = caregiver
+
+    response = app.test_client().post(f"/patient/bulk-add-courses/{patient.id}", headers=headers, json={"courses": courses})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("courses[")
+    for model in (Course, Medicine, DoseSlot, ScheduleChange):
+        assert session.query(model).count() == 0
+
+
+def test_bulk_add_to_another_users_patient_is_refused(app, session, caregiver, add_patient):
+    user, headers = caregiver
+    _, other_patient, _ = add_patient()
+
+    response = app.test_client().post(f"/patient/bulk-add-courses/{other_patient.id}", headers=headers,
+                                      json={"course_name": "course", "medicines": [medicine("Paracetamol")]})
+
+    assert response.status_code == 404
+    assert session.query(Course).filter_by(patient_id=other_patient.id).count() == 1  # Only its own course
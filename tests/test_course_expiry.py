@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from app.models import Course, Medicine, refresh_course_expiry
+
+
+def course_expiry(session, course_id):
+    return tuple(session.query(Course.expires_at, Course.active).filter_by(id=course_id).one())
+
+
+def medicine_expiry(session, medicine_id):
+    return session.query(Medicine.expiry_at).filter_by(id=medicine_id).scalar()
+
+
+def test_course_expiry_follows_its_medicines(app, session, caregiver, add_patient):
+    user, headers = caregiver
+    _, patient, (first,) = add_patient(user, duration=5)
+    course_id = first.course_id
+    client = app.test_client()
+
+    response = client.post(f"/patient/add-medicine/{course_id}", headers=headers, json={
+        "medicine_name": "Ibuprofen", "medicine_duration": 10, "medicine_times": ["20:00"]
+    })
+    assert response.status_code == 201
+    longest = session.query(Medicine.id).filter_by(course_id=course_id, name="Ibuprofen").scalar()
+    assert course_expiry(session, course_id) == (medicine_expiry(session, longest), True)
+
+    assert client.delete(f"/patient/delete-medicine/{longest}", headers=headers).status_code == 200
+    assert course_expiry(session, course_id) == (medicine_expiry(session, first.id), True)
+
+
+def test_adding_a_medicine_reactivates_an_expired_course(app, session, caregiver, add_patient):
+    user, headers = caregiver
+    _, patient, (medicine,) = add_patient(user)
+    session.query(Medicine).filter_by(id=medicine.id).update({Medicine.expiry_at: datetime.utcnow() - timedelta(days=1)})
+    refresh_course_expiry([medicine.course_id])
+    session.commit()
+    assert course_expiry(session, medicine.course_id)[1] is False
+
+    response = app.test_client().post(f"/patient/add-medicine/{medicine.course_id}", headers=headers, json={
+        "medicine_name": "Ibuprofen", "medicine_duration": 3, "medicine_times": ["20:00"]
+    })
+
+    assert response.status_code == 201
+    assert course_expiry(session, medicine.course_id)[1] is True
+
+
+def test_courses_are_filtered_by_status(app, session, caregiver, add_patient):
+    user, headers = caregiver
+    _, patient, (active,) = add_patient(user)
+    expired = Medicine(name="Amoxicillin", duration=1)
+    expired.set_times(["08:00"])
+    expired.expiry_at = datetime.utcnow() - timedelta(days=1)
+    patient.courses.append(Course(name="expired course", expires_at=expired.expiry_at, active=False, medicines=[expired]))
+    session.commit()
+    active_name = active.course.name
+    client = app.test_client()
+
+    def names(status=None):
+        query = f"?status={status}" if status else ""
+        response = client.get(f"/patient/get-all-courses/{patient.id}{query}", headers=headers)
+        assert response.status_code == 200
+        return sorted((course["name"], course["status"]) for course in response.get_json())
+
+    assert names("active") == [(active_name, "Active")]
+    assert names("expired") == [("expired course", "Expired")]
+    assert names() == [(active_name, "Active"), ("expired course", "Expired")]
+    assert client.get(f"/patient/get-all-courses/{patient.id}?status=done", headers=headers).status_code == 400
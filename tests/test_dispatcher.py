@@ -0,0 +1,101 @@
+import threading
+import time
+from app.scheduler.call_rate import SharedRateLimiter
+from app.scheduler.dispatcher import CallDispatcher
+from app.scheduler.fake_twilio import FakeTwilioClient
+
+
+def place_calls(dispatcher, count, **submit_kwargs):
+    """Submit count calls, wait until the workers placed them all and return the elapsed seconds"""
+    dispatcher.start()
+    started = time.monotonic()
+    for i in range(count):
+        assert dispatcher.submit(to=f"+91{i:010d}", from_="+10000000000", url="https://example.test", **submit_kwargs)
+    dispatcher.stop()
+    return time.monotonic() - started
+
+
+def test_calls_run_concurrently():
+    client = FakeTwilioClient(latency=0.2)
+    dispatcher = CallDispatcher(client, workers=4, calls_per_second=1000)
+
+    elapsed = place_calls(dispatcher, 8)
+
+    assert len(client.calls.created) == 8
+    assert elapsed < 8 * 0.2 / 2  # Serially this takes 1.6s, four workers need about 0.4s
+    assert dispatcher.stats()["placed"] == 8
+
+
+def test_rate_limit_caps_calls_per_second():
+    client = FakeTwilioClient()
+    dispatcher = CallDispatcher(client, workers=4, calls_per_second=20)
+
+    elapsed = place_calls(dispatcher, 10)
+
+    assert len(client.calls.created) == 10
+    assert elapsed >= (10 - 1) / 20  # The first call goes out at once, then one every 1/rate seconds
+
+
+def test_full_queue_drops_calls():
+    dispatcher = CallDispatcher(FakeTwilioClient(), workers=1, queue_size=2)  # Not started, nothing drains the queue
+
+    submitted = [dispatcher.submit(to=f"+91{i:010d}") for i in range(3)]
+
+    assert submitted == [True, True, False]
+    stats = dispatcher.stats()
+    assert (stats["submitted"], stats["dropped"], stats["queue_depth"]) == (2, 1, 2)
+
+
+def test_before_call_skips_the_call():
+    client = FakeTwilioClient()
+    dispatcher = CallDispatcher(client, workers=2, calls_per_second=1000)
+    results = []
+
+    dispatcher.start()
+    dispatcher.submit(to="+911", before_call=lambda: True, on_result=lambda call, error: results.append(call))
+    dispatcher.submit(to="+912", before_call=lambda: False, on_result=lambda call, error: results.append(call))
+    dispatcher.submit(to="+913", before_call=lambda: 1 / 0, on_result=lambda call, error: results.append(call))
+    dispatcher.stop()
+
+    assert [call.kwargs["to"] for call in client.calls.created] == ["+911"]
+    assert len(results) == 1  # Skipped calls have no outcome
+    assert dispatcher.stats()["skipped"] == 2
+
+
+def test_failed_calls_reach_on_result():
+    client = FakeTwilioClient(fail_every=3)
+    dispatcher = CallDispatcher(client, workers=2, calls_per_second=1000)
+    errors = []
+    lock = threading.Lock()
+
+    def on_result(call, error):
+        with lock:
+            errors.append(error)
+
+    place_calls(dispatcher, 6, on_result=on_result)
+
+    assert len(errors) == 6
+    assert sum(error is not None for error in errors) == 2
+    stats = dispatcher.stats()
+    assert (stats["placed"], stats["failed"]) == (4, 2)
+
+
+def test_shared_rate_limit_spans_dispatchers(app, session):
+    # Two nodes with their own dispatcher and limiter, drawing from the same database row
+    clients = [FakeTwilioClient(), FakeTwilioClient()]
+    dispatchers = []
+    for client in clients:
+        limiter = SharedRateLimiter("twilio_calls", 20)
+        limiter.app = app
+        dispatchers.append(CallDispatcher(client, workers=2, rate_limiter=limiter))
+
+    threads = [threading.Thread(target=place_calls, args=(dispatcher, 5)) for dispatcher in dispatchers]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    assert sum(len(client.calls.created) for client in clients) == 10
+    assert elapsed >= (10 - 1) / 20  # Each node alone would be done in about half of that
@@ -0,0 +1,57 @@
+import pytest
+from app.models import Course, Medicine
+from app.routes import etag
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(etag, "ETAG_MAX_AGE", 10 ** 9)  # No time bucket rollover in the middle of a test
+    return app.test_client()
+
+
+def test_unchanged_data_is_not_modified(client, caregiver):
+    user, headers = caregiver
+
+    first = client.get("/user/get-patients", headers=headers)
+    assert first.status_code == 200 and first.headers["ETag"].startswith('W/"')
+
+    again = client.get("/user/get-patients", headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_every_write_changes_the_etag(client, caregiver, session):
+    user, headers = caregiver
+    medicine = {"medicine_name": "Paracetamol", "medicine_duration": 5, "medicine_times": ["08:00"]}
+    etags = []
+
+    def write(method, path, json=None):
+        before = client.get("/user/get-user", headers=headers).headers["ETag"]
+        response = client.open(path, method=method, headers=headers, json=json)
+        assert response.status_code in (200, 201), response.get_json()
+        stale = client.get("/user/get-user", headers=dict(headers, **{"If-None-Match": before}))
+        assert stale.status_code == 200  # The cached copy is no longer current
+        etags.append(stale.headers["ETag"])
+        return response.get_json()
+
+    patient_id = write("POST", "/patient/add-patient", {"name": "patient", "age": 70, "phone": "+910000000000"})["patient_id"]
+    write("POST", f"/patient/add-course/{patient_id}", dict(medicine, course_name="course"))
+    course_id = session.query(Course.id).scalar()
+    write("POST", f"/patient/add-medicine/{course_id}", dict(medicine, medicine_name="Ibuprofen"))
+    write("POST", f"/patient/bulk-add-courses/{patient_id}", {"course_name": "bulk", "medicines": [medicine]})
+    medicine_id = session.query(Medicine.id).filter_by(course_id=course_id, name="Ibuprofen").scalar()
+    write("DELETE", f"/patient/delete-medicine/{medicine_id}")
+    write("DELETE", f"/patient/delete-course/{course_id}")
+    write("DELETE", f"/patient/remove-patient/{patient_id}")
+
+    assert len(set(etags)) == len(etags)
+
+
+def test_rejected_write_keeps_the_etag(client, caregiver):
+    user, headers = caregiver
+    before = client.get("/user/get-user", headers=headers).headers["ETag"]
+
+    assert client.post("/patient/add-patient", headers=headers, json={"name": "patient"}).status_code == 400
+
+    assert client.get("/user/get-user", headers=dict(headers, **{"If-None-Match": before})).status_code == 304
@@ -0,0 +1,101 @@
+import json
+import queue
+import threading
+from app import events
+from app.events import RESYNC, EventBus, LocalBroker, RedisBroker
+from app.routes.user_routes import event_bus
+
+
+def test_poll_timeout_is_clamped(app, caregiver):
+    user, headers = caregiver
+    client = app.test_client()
+
+    response = client.get("/user/events/poll?timeout=-1", headers=headers)
+    assert (response.status_code, response.get_json()) == (200, [])
+
+    assert client.get("/user/events/poll?timeout=nan", headers=headers).status_code == 400
+    assert client.get("/user/events/poll?timeout=soon", headers=headers).status_code == 400
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def psubscribe(self, pattern):
+        self.redis.connects += 1
+        if self.redis.connects == 1:
+            raise ConnectionError("Connection refused")
+
+    def listen(self):
+        yield {"channel": b"medify:events:user-1", "data": b'7 {"type": "call"}'}
+        threading.Event().wait()  # Stay subscribed
+
+    def close(self):
+        pass
+
+
+class FakeRedis:
+    connects = 0
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+def test_redis_listener_reconnects(monkeypatch):
+    monkeypatch.setattr(events.time, "sleep", lambda seconds: None)
+    broker = RedisBroker.__new__(RedisBroker)  # Without connecting to a real Redis
+    broker._redis = FakeRedis()
+    delivered = queue.Queue()
+
+    broker.start(lambda user_id, event_id, message: delivered.put((user_id, event_id, message)))
+
+    assert delivered.get(timeout=2) == ("user-1", 7, '{"type": "call"}')
+    assert broker._redis.connects == 2
+
+
+def test_events_between_polls_are_replayed(app, caregiver):
+    user, headers = caregiver
+    client = app.test_client()
+    event_bus.publish(user.id, {"type": "call", "status": "initiated"})
+    first, = client.get("/user/events/poll?timeout=0&after=0", headers=headers).get_json()
+
+    # Published while no poll was open
+    event_bus.publish(user.id, {"type": "call", "status": "failed"})
+    event_bus.publish(user.id, {"type": "medicine_log", "is_taken": True})
+    missed = client.get(f"/user/events/poll?timeout=0&after={first['event_id']}", headers=headers).get_json()
+
+    assert [event["type"] for event in missed] == ["call", "medicine_log"]
+    assert first["event_id"] < missed[0]["event_id"] < missed[1]["event_id"]
+    assert client.get(f"/user/events/poll?timeout=0&after={missed[1]['event_id']}", headers=headers).get_json() == []
+    assert client.get("/user/events/poll?after=last", headers=headers).status_code == 400
+
+
+def test_sse_replays_after_last_event_id(app, caregiver):
+    user, headers = caregiver
+    client = app.test_client()
+    event_bus.publish(user.id, {"type": "call", "status": "initiated"})
+    event_bus.publish(user.id, {"type": "call", "status": "failed"})
+    first, second = client.get("/user/events/poll?timeout=0&after=0", headers=headers).get_json()
+
+    response = client.get("/user/events", headers={**headers, "Last-Event-ID": str(first["event_id"])}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 3000\n\n"
+    event_id, event_type, data = next(chunks).decode().splitlines()[:3]
+    response.close()
+
+    assert (event_id, event_type) == (f"id: {second['event_id']}", "event: call")
+    assert json.loads(data[len("data: "):])["status"] == "failed"
+
+
+def test_resync_when_missed_events_were_dropped():
+    bus = EventBus(LocalBroker(), replay_size=2)
+    for status in ("one", "two", "three"):
+        bus.publish("user-1", {"type": "call", "status": status})
+    first_id = bus._dropped["user-1"]
+
+    subscriber = bus.subscribe("user-1", after=first_id - 1)
+    replayed = [subscriber.get_nowait()[1] for _ in range(subscriber.qsize())]
+
+    assert replayed[0] == RESYNC
+    assert [json.loads(message)["status"] for message in replayed[1:]] == ["two", "three"]
+    assert bus.subscribe("user-1", after=first_id).qsize() == 2  # Nothing missing, no resync
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.config import db
+from app.models import User, Course, Medicine, retire_expired
+from app.scheduler import scheduler
+from app.scheduler.timing_wheel import timing_wheel
+
+
+def test_sweeper_retires_expired_medicines(session, add_patient, monkeypatch):
+    monkeypatch.setattr(scheduler.leader, "is_leader", lambda: True)
+    user, patient, (medicine,) = add_patient()
+    scheduler.rebuild_timing_wheel()
+    assert len(timing_wheel) == 1
+    version = user.data_version
+
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    session.query(Medicine).update({Medicine.expiry_at: expired})
+    session.query(Course).update({Course.expires_at: expired})
+    session.commit()
+    scheduler.sweep_expired()
+
+    session.expire_all()
+    assert not session.get(Medicine, medicine.id).active
+    assert not session.get(Course, patient.courses[0].id).active
+    assert session.get(User, user.id).data_version == version + 1  # The listings' ETags change
+    assert len(timing_wheel) == 0
+
+
+def test_course_extended_during_the_sweep_stays_active(session, add_patient):
+    _, patient, _ = add_patient()
+    course_id = patient.courses[0].id
+    now = datetime.utcnow()
+    session.query(Course).update({Course.expires_at: now - timedelta(minutes=1)})
+    session.commit()
+
+    # A medicine added between the sweeper's SELECT and its UPDATE pushes the course expiry out
+    extended = []
+
+    def extend_course(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT course.id") and not extended:
+            extended.append(True)
+            conn.exec_driver_sql("UPDATE course SET expires_at = ?", (now + timedelta(days=5),))
+
+    event.listen(db.engine, "after_cursor_execute", extend_course)
+    try:
+        retire_expired(now)
+        session.commit()
+    finally:
+        event.remove(db.engine, "after_cursor_execute", extend_course)
+
+    assert extended
+
+    session.expire_all()
+    assert session.get(Course, course_id).active
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+LEASE_SECONDS = 1
+
+# One scheduler node: heartbeats every 0.1s from `start` and prints its (time, is_leader) samples.
+# "crash" stops heartbeating at start + 1s without releasing, "release" gives the lease up once it led after start + 3s.
+NODE = """
+import json, sys, time
+from app.config import create_app
+from app.scheduler.scheduler import leader
+
+role, start = sys.argv[1], float(sys.argv[2])
+app = create_app()
+samples = []
+with app.app_context():
+    time.sleep(max(start - time.time(), 0))
+    while time.time() < start + 4.5:
+        now = time.time()
+        if role == "crash" and now > start + 1:
+            break
+        samples.append((now, leader.heartbeat()))
+        if role == "release" and samples[-1][1] and now > start + 3:
+            leader.release()
+            break
+        time.sleep(0.1)
+print(json.dumps(samples))
+"""
+
+
+def leading(samples):
+    return [at for at, is_leader in samples if is_leader]
+
+
+def test_one_leader_and_failover_across_processes(session):
+    env = dict(os.environ, LEADER_LEASE_SECONDS=str(LEASE_SECONDS))
+    start = time.time() + 5  # Lets every process import the app first
+    roles = {"crash": start, "release-1": start + 0.3, "release-2": start + 0.3}
+    nodes = {
+        name: subprocess.Popen(
+            [sys.executable, "-c", NODE, name.split("-")[0], str(at)],
+            env=env, cwd=os.path.dirname(os.path.dirname(__file__)), stdout=subprocess.PIPE, text=True
+        )
+        for name, at in roles.items()
+    }
+    samples = {name: json.loads(node.communicate(timeout=60)[0].splitlines()[-1]) for name, node in nodes.items()}
+
+    # The first node leads until it stops, the lease keeps the others out until it runs out
+    crashed = samples["crash"]
+    assert crashed and all(is_leader for at, is_leader in crashed)
+    takeover = crashed[-1][0] + LEASE_SECONDS
+    for name in ("release-1", "release-2"):
+        assert all(at >= takeover - 0.05 for at in leading(samples[name]))
+
+    # Then exactly one of the others takes over, releases, and the last one follows at once
+    first, second = sorted(("release-1", "release-2"), key=lambda name: min(leading(samples[name]), default=float("inf")))
+    assert leading(samples[first]) and leading(samples[second])
+    assert min(leading(samples[first])) < takeover + 0.5
+    assert max(leading(samples[first])) < min(leading(samples[second])) < max(leading(samples[first])) + 0.5
@@ -0,0 +1,28 @@
+import os
+from datetime import datetime
+from app.log_archive import log_archive
+from app.models import MedicineLog
+from app.routes.authz import delete_medicines
+
+
+def test_archive_is_partitioned_by_user_and_hides_deleted_medicines(app, session, caregiver, add_patient, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_archive, "directory", str(tmp_path))
+    user, headers = caregiver
+    _, _, (kept, deleted) = add_patient(user, medicines=["Paracetamol", "Aspirin"])
+    other, _, (other_medicine,) = add_patient(medicines=["Ibuprofen"])
+    for day in (3, 4):
+        for medicine in (kept, deleted, other_medicine):
+            session.add(MedicineLog(medicine_id=medicine.id, is_taken=True, created_at=datetime(2026, 1, day)))
+    session.commit()
+
+    assert log_archive.archive_cold_months(datetime(2026, 10, 18)) == 6
+    assert session.query(MedicineLog).count() == 0
+    assert sorted(os.listdir(tmp_path / "medicine_log-2026-01")) == sorted([user.id, other.id])
+
+    delete_medicines([deleted.id])
+    session.commit()
+    response = app.test_client().get(
+        "/user/archived-logs?since=2026-01-01T00:00:00&until=2026-02-01T00:00:00", headers=headers
+    )
+    assert response.status_code == 200
+    assert [log["medicine_id"] for log in response.get_json()["logs"]] == [kept.id, kept.id]
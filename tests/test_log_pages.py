@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from app.models import MedicineLog
+
+
+def test_patient_log_pages_merge_every_medicine(app, session, caregiver, add_patient):
+    user, headers = caregiver
+    _, patient, medicines = add_patient(user, medicines=["Paracetamol", "Aspirin", "Ibuprofen"])
+    now = datetime.utcnow().replace(microsecond=0)
+    # Every medicine logs at the same times, so pages also break ties on the id
+    session.add_all(
+        MedicineLog(medicine_id=medicine.id, is_taken=True, created_at=now - timedelta(hours=i))
+        for medicine in medicines for i in range(5)
+    )
+    session.commit()
+    client = app.test_client()
+
+    pages, cursor = [], None
+    while True:
+        query = f"&cursor={cursor}" if cursor else ""
+        page = client.get(f"/user/patient-logs/{patient.id}?limit=4{query}", headers=headers).get_json()
+        pages.append(page["logs"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert [len(page) for page in pages] == [4, 4, 4, 3]
+    expected = sorted(session.query(MedicineLog), key=lambda log: (log.created_at, log.id), reverse=True)
+    assert [log["id"] for page in pages for log in page] == [log.id for log in expected]
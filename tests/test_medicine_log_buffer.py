@@ -0,0 +1,78 @@
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from app.models import MedicineLog, AdherenceDaily, generate_uuid
+from app.scheduler import scheduler
+from app.scheduler.log_buffer import MedicineLogBuffer
+from app.scheduler.scheduler import medicine_log_buffer
+
+
+def test_legacy_callback_owners_come_from_the_medicine(app, session, add_patient, monkeypatch):
+    monkeypatch.setattr(scheduler, "TWILIO_LEGACY_CALLBACKS", True)
+    _, patient, (medicine,) = add_patient()
+    _, other_patient, _ = add_patient()
+    client = app.test_client()
+
+    # Forged patient_id, and one without any patient_id
+    client.post(f"/twilio/handle_ivr_response?medicine_id={medicine.id}&patient_id={other_patient.id}", data={"Digits": "1"})
+    client.post(f"/twilio/handle_ivr_response?medicine_id={medicine.id}", data={"Digits": "2"})
+    medicine_log_buffer.flush()
+
+    assert session.query(MedicineLog).filter_by(medicine_id=medicine.id).count() == 2
+    rollup = session.query(AdherenceDaily).one()
+    assert (rollup.patient_id, rollup.taken_count, rollup.missed_count) == (patient.id, 1, 1)
+
+
+def log_row(medicine, row_id=None):
+    return {'id': row_id or generate_uuid(), 'medicine_id': medicine.id, 'is_taken': True, 'created_at': datetime.utcnow()}
+
+
+def test_full_buffer_rejects_rows(app, session, add_patient):
+    _, _, (medicine,) = add_patient()
+    buffer = MedicineLogBuffer(max_rows=100, max_delay=60, max_pending=2)
+
+    assert [buffer.add(log_row(medicine)) for _ in range(3)] == [True, True, False]
+    assert buffer.stats()["overflow"] == 1
+    assert buffer.stats()["pending"] == 2
+
+
+def test_bad_row_is_quarantined_without_holding_back_the_batch(app, session, add_patient):
+    _, _, (medicine,) = add_patient()
+    buffer = MedicineLogBuffer(max_rows=100, max_delay=60, max_attempts=2)
+    buffer._app = app
+    existing = log_row(medicine)
+    buffer.add(existing)
+    buffer.flush()
+
+    # A duplicate id fails the insert of its batch
+    buffer.add(log_row(medicine))
+    buffer.add(dict(existing))
+    buffer.add(log_row(medicine))
+    buffer.flush()
+    assert session.query(MedicineLog).count() == 3
+    assert buffer.stats()["pending"] == 1
+
+    buffer.flush()
+    stats = buffer.stats()
+    assert (stats["pending"], stats["quarantined"], stats["flushed"]) == (0, 1, 3)
+
+
+def test_rows_are_kept_while_the_database_is_down(app, session, add_patient, monkeypatch):
+    _, _, (medicine,) = add_patient()
+    buffer = MedicineLogBuffer(max_rows=100, max_delay=60, max_attempts=1)
+    buffer._app = app
+    buffer.add(log_row(medicine))
+    buffer.add(log_row(medicine))
+
+    def database_down(rows):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(buffer, "_write", database_down)
+    monkeypatch.setattr(buffer, "_database_up", lambda: False)
+    buffer.flush()
+    assert (buffer.stats()["pending"], buffer.stats()["quarantined"]) == (2, 0)
+    assert buffer._backoff > 0
+
+    monkeypatch.undo()
+    buffer.flush()
+    assert session.query(MedicineLog).count() == 2
+    assert (buffer.stats()["pending"], buffer._backoff) == (0, 0)
@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+import pytz
+from app.config import db
+from app.models import ReminderOccurrence, SchedulerState
+from app.scheduler import scheduler
+from app.scheduler.dispatcher import CallDispatcher
+from app.scheduler.fake_twilio import FakeTwilioClient
+from app.scheduler.timing_wheel import Reminder
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+class FrozenClock(datetime):
+    """datetime whose utcnow() returns the times queued in `times`, one per call"""
+    times = []
+
+    @classmethod
+    def utcnow(cls):
+        return cls.times.pop(0)
+
+
+def test_tick_lag_is_measured_from_the_watermark(app, monkeypatch):
+    due = datetime(2026, 10, 18, 12, 1)
+    FrozenClock.times = [due, due + timedelta(seconds=2), due + timedelta(seconds=77)]  # A 75s tick fired 2s late
+    monkeypatch.setattr(scheduler, "datetime", FrozenClock)
+    monkeypatch.setattr(scheduler.leader, "is_leader", lambda: True)
+    monkeypatch.setattr(scheduler, "apply_schedule_changes", lambda now_utc: 0)
+    monkeypatch.setattr(scheduler, "process_due_minutes", lambda now_utc: (1, 0))
+    monkeypatch.setattr(scheduler, "drain_reminder_outbox", lambda: None)
+
+    scheduler.check_medicine_times()
+
+    assert scheduler.tick_metrics.stats()["last"]["lag_seconds"] == 77
+
+
+def materialize_due(add_patient, count, now):
+    """Materialize count reminders due at now into a single shard"""
+    user = None
+    reminders = []
+    for _ in range(count):
+        user, patient, (medicine,) = add_patient(user)
+        reminders.append(Reminder(medicine.id, medicine.name, patient.id, patient.phone, user.id, medicine.expiry_at))
+    scheduler.reminder_shards.materialize(reminders, now)
+    db.session.commit()
+
+
+def test_claims_are_limited_to_the_queue_room(session, add_patient, monkeypatch):
+    monkeypatch.setattr(scheduler.reminder_shards, "shards", 1)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    materialize_due(add_patient, 5, now)
+    (scheduled_at, shard), = scheduler.reminder_shards.open_shards(now)
+
+    first = scheduler.reminder_shards.claim("node-a", scheduled_at, shard, now, limit=3)
+    second = scheduler.reminder_shards.claim("node-b", scheduled_at, shard, now, limit=3)
+
+    assert (len(first), len(second)) == (3, 2)
+    assert not {occurrence_id for occurrence_id, _ in first} & {occurrence_id for occurrence_id, _ in second}
+    assert scheduler.reminder_shards.open_shards(now) == []
+
+
+def test_renewed_claims_are_not_released(session, add_patient, monkeypatch):
+    monkeypatch.setattr(scheduler.reminder_shards, "shards", 1)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    materialize_due(add_patient, 2, now)
+    (scheduled_at, shard), = scheduler.reminder_shards.open_shards(now)
+    scheduler.reminder_shards.claim("live", scheduled_at, shard, now, limit=1)
+    scheduler.reminder_shards.claim("dead", scheduled_at, shard, now, limit=1)
+
+    later = now + timedelta(seconds=scheduler.reminder_shards.claim_timeout + 1)
+    assert scheduler.reminder_shards.renew_claims("live", later) == 1
+    released, _, _ = scheduler.reminder_shards.recover(later)
+
+    assert released == 1  # Only the dead node's claim went stale
+    claimed = session.query(ReminderOccurrence.claimed_by).filter(ReminderOccurrence.status == 'claimed').all()
+    assert claimed == [("live",)]
+
+
+class Clock(datetime):
+    """datetime whose utcnow() returns `now`, moved by the test"""
+    now = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now
+
+
+def drain_at(dispatcher, now):
+    """Run one drain at the given time and wait for the calls it queued"""
+    Clock.now = now
+    dispatcher.start()
+    scheduler.drain_reminder_outbox()
+    dispatcher.stop()
+
+
+def occurrence(*columns):
+    """The given columns of the only stored occurrence"""
+    row, = db.session.query(*columns).all()
+    return tuple(row)
+
+
+def occurrence_state():
+    return occurrence(ReminderOccurrence.status, ReminderOccurrence.attempts, ReminderOccurrence.next_attempt_at)
+
+
+def test_failed_calls_are_retried_with_backoff(session, add_patient, monkeypatch):
+    client = FakeTwilioClient(fail_every=1)
+    dispatcher = CallDispatcher(client, workers=1, calls_per_second=1000)
+    monkeypatch.setattr(scheduler, "dispatcher", dispatcher)
+    monkeypatch.setattr(scheduler, "datetime", Clock)
+    shards = scheduler.reminder_shards
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    materialize_due(add_patient, 1, now)
+
+    drain_at(dispatcher, now)
+    first_retry = now + timedelta(seconds=shards.retry_base)
+    assert occurrence_state() == ("pending", 1, first_retry)
+
+    drain_at(dispatcher, first_retry - timedelta(seconds=1))  # Not due yet
+    assert occurrence_state() == ("pending", 1, first_retry)
+
+    drain_at(dispatcher, first_retry)
+    second_retry = first_retry + timedelta(seconds=2 * shards.retry_base)
+    assert occurrence_state() == ("pending", 2, second_retry)
+
+    drain_at(dispatcher, second_retry)
+    assert occurrence_state()[:2] == ("failed", shards.max_attempts)
+
+    drain_at(dispatcher, second_retry + timedelta(minutes=1))
+    assert dispatcher.stats()["failed"] == shards.max_attempts  # Given up, not called again
+
+
+def test_dead_node_claims_are_sent_once(session, add_patient, monkeypatch):
+    client = FakeTwilioClient()
+    dispatcher = CallDispatcher(client, workers=1, calls_per_second=1000)
+    monkeypatch.setattr(scheduler, "dispatcher", dispatcher)
+    monkeypatch.setattr(scheduler, "datetime", Clock)
+    shards = scheduler.reminder_shards
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    materialize_due(add_patient, 1, now)
+    (scheduled_at, shard), = shards.open_shards(now)
+    (occurrence_id, _), = shards.claim("dead", scheduled_at, shard, now, limit=10)
+
+    drain_at(dispatcher, now + timedelta(seconds=shards.claim_timeout - 1))  # Still within the dead node's claim
+    assert client.calls.created == []
+
+    drain_at(dispatcher, now + timedelta(seconds=shards.claim_timeout + 1))
+    drain_at(dispatcher, now + timedelta(seconds=shards.claim_timeout + 2))
+
+    assert len(client.calls.created) == 1
+    assert occurrence(ReminderOccurrence.status, ReminderOccurrence.claimed_by) == ("sent", scheduler.leader.node_id)
+    assert not shards.start_sending(occurrence_id, "dead", Clock.now)  # A late dead node cannot call it again
+
+
+def test_missed_minutes_are_caught_up_within_the_grace_window(session, add_patient):
+    grace = scheduler.reminder_shards.grace_minutes
+    now = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(seconds=1)
+
+    def ist_time(minutes_ago):
+        due = (now - timedelta(minutes=minutes_ago)).replace(tzinfo=pytz.utc).astimezone(IST)
+        return f"{due.hour:02d}:{due.minute:02d}"
+
+    # One patient due before the grace window, one inside it and one this minute
+    user = None
+    for minutes_ago in (grace + 2, grace - 3, 0):
+        user, _, _ = add_patient(user, times=[ist_time(minutes_ago)])
+    session.add(SchedulerState(name="medicine_checker", processed_until=now.replace(second=0) - timedelta(minutes=grace + 5)))
+    session.commit()
+    assert scheduler.leader.heartbeat()
+    scheduler.rebuild_timing_wheel()
+
+    minutes, reminders = scheduler.process_due_minutes(now)
+
+    assert (minutes, reminders) == (grace, 2)
+    stored = sorted(scheduled_at for scheduled_at, in session.query(ReminderOccurrence.scheduled_at))
+    current = now.replace(second=0)
+    assert stored == [current - timedelta(minutes=grace - 3), current]
+    assert session.get(SchedulerState, "medicine_checker").processed_until == current
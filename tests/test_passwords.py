@@ -0,0 +1,27 @@
+import time
+import pytest
+from app.passwords import PasswordHasher, HashingBusy, password_hasher
+
+
+def test_hash_and_verify_in_the_started_pool(app):
+    password_hash = password_hasher.hash("secret")
+
+    assert password_hasher.verify(password_hash, "secret") == (True, None)
+    assert password_hasher.verify(password_hash, "wrong") == (False, None)
+
+
+def test_timed_out_job_stays_pending_until_it_finishes():
+    hasher = PasswordHasher("pbkdf2:sha256", workers=1, max_pending=1, timeout=0.05)
+
+    with pytest.raises(HashingBusy):
+        hasher._run(time.sleep, 0.3)
+    assert hasher.stats()["pending"] == 1
+
+    # The worker is still busy with it, so the limit still applies
+    with pytest.raises(HashingBusy):
+        hasher._run(time.sleep, 0)
+    assert hasher.stats()["rejected"] == 1
+
+    time.sleep(0.4)
+    assert hasher.stats()["pending"] == 0
+    assert hasher.stats()["timed_out"] == 1
@@ -0,0 +1,47 @@
+import copy
+import pytest
+from flask import jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.config import create_app, db
+from app.profiling import endpoint_metrics, init_profiling
+
+
+@pytest.fixture
+def profiled(app):
+    """A separate app with the profiling listeners on its own engine"""
+    profiled = create_app()
+
+    @profiled.route("/failing-query")
+    def failing_query():
+        try:
+            db.session.execute(text("SELECT * FROM missing_table"))
+        except OperationalError:
+            db.session.rollback()
+        db.session.execute(text("SELECT 1"))
+        return jsonify()
+
+    init_profiling(profiled)
+    return profiled
+
+
+def test_failed_statements_leave_no_state_on_the_pooled_connection(profiled):
+    with profiled.app_context(), db.engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+        before = copy.deepcopy(dict(conn.info))
+
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("SELECT * FROM missing_table")
+            conn.rollback()
+        conn.exec_driver_sql("SELECT 1")
+
+        assert dict(conn.info) == before
+
+
+def test_failed_statement_is_not_counted(profiled):
+    assert profiled.test_client().get("/failing-query").status_code == 200
+
+    stats = endpoint_metrics.stats()["failing_query"]
+    assert stats["sql_statements"] == 1
+    assert 0 <= stats["sql_seconds"] < 1
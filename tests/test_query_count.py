@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+import pytz
+from app.config import db
+from app.models import User, Patient, Course, Medicine, DoseSlot, SchedulerState, ReminderOccurrence
+from app.scheduler import scheduler
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+def tick_query_counts(statements, add_patient, due):
+    """Statements run by a wheel rebuild, a tick and the claim of the tick's reminders"""
+    db.session.query(ReminderOccurrence).delete()
+    db.session.query(SchedulerState).delete()
+    for model in (DoseSlot, Medicine, Course, Patient, User):
+        db.session.query(model).delete()
+    db.session.commit()
+
+    now = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(seconds=1)
+    ist = now.replace(tzinfo=pytz.utc).astimezone(IST)
+    # due patients with one medicine each, all due this minute
+    user = None
+    for _ in range(due):
+        user, _, _ = add_patient(user, times=[f"{ist.hour:02d}:{ist.minute:02d}"])
+    assert scheduler.leader.heartbeat()
+
+    counts = {}
+    statements.clear()
+    scheduler.rebuild_timing_wheel()
+    counts["rebuild"] = len(statements)
+
+    statements.clear()
+    minutes, reminders = scheduler.process_due_minutes(now)
+    counts["tick"] = len(statements)
+    assert (minutes, reminders) == (1, due)
+
+    statements.clear()
+    claimed = []
+    for scheduled_at, shard in scheduler.reminder_shards.open_shards(now):
+        claimed += scheduler.reminder_shards.claim("node", scheduled_at, shard, now, limit=100)
+    counts["claim"] = len(statements)
+    assert len(claimed) == due
+
+    return counts
+
+
+def test_tick_query_count_does_not_grow_with_due_reminders(session, statements, add_patient, monkeypatch):
+    # One shard, so the claim is one group however many patients are due
+    monkeypatch.setattr(scheduler.reminder_shards, "shards", 1)
+
+    assert tick_query_counts(statements, add_patient, 1) == tick_query_counts(statements, add_patient, 50)
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import re
+import pytest
+from sqlalchemy import event
+from app.config import db
+from app.models import MedicineLog, retire_expired
+from app.routes.authz import owns_patient, owns_course, owned_medicine_course
+from app.scheduler.scheduler import reminder_shards
+from app.scheduler.timing_wheel import Reminder
+
+# A table read from start to end; SCAN of a subquery result or a constant row is fine
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)")
+# Rows sorted after they are read: a page would then sort every matching row, not just the page
+TEMP_SORT = re.compile(r"^USE TEMP B-TREE")
+
+
+@pytest.fixture
+def hot_queries(session):
+    """List recording the SELECT/UPDATE/DELETE statements (with parameters) run while the test runs"""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            recorded.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def assert_no_full_scans(recorded, sorted_from_index=False):
+    """Fail if SQLite plans a full table scan for one of the recorded statements
+    (or, with sorted_from_index, sorts rows in a temp B-tree instead of reading them in index order)"""
+    assert recorded
+    checks = (FULL_SCAN, TEMP_SORT) if sorted_from_index else (FULL_SCAN,)
+    scans = []
+    with db.engine.connect() as conn:
+        for statement, parameters in recorded:
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            scans += [
+                f"{row[-1]} in: {statement}" for row in plan if any(check.match(row[-1]) for check in checks)
+            ]
+    assert not scans, "\n".join(scans)
+
+
+@pytest.fixture
+def add_medicine(add_patient):
+    """Factory adding a user's patient taking one medicine with three logs, returns (user, patient, medicine)"""
+    def add(duration=5):
+        user, patient, (medicine,) = add_patient(duration=duration)
+        db.session.add_all(
+            MedicineLog(medicine_id=medicine.id, is_taken=True, created_at=datetime.utcnow() - timedelta(hours=i))
+            for i in range(3)
+        )
+        db.session.commit()
+        return user, patient, medicine
+    return add
+
+
+def test_ownership_checks(hot_queries, add_medicine):
+    user, patient, medicine = add_medicine()
+
+    assert owns_patient(user.id, patient.id)
+    assert owns_course(user.id, medicine.course_id)
+    assert owned_medicine_course(user.id, medicine.id) == medicine.course_id
+
+    assert_no_full_scans(hot_queries)
+
+
+def test_log_pages(app, caregiver, add_patient, hot_queries):
+    user, headers = caregiver
+    _, patient, medicines = add_patient(user, medicines=["Paracetamol", "Aspirin"])
+    now = datetime.utcnow()
+    db.session.add_all(
+        MedicineLog(medicine_id=medicine.id, is_taken=True, created_at=now - timedelta(hours=i))
+        for medicine in medicines for i in range(3)
+    )
+    db.session.commit()
+    client = app.test_client()
+
+    first = client.get(f"/user/medicine-logs/{medicines[0].id}?limit=2", headers=headers).get_json()
+    client.get(f"/user/medicine-logs/{medicines[0].id}?limit=2&cursor={first['next_cursor']}", headers=headers)
+    page = client.get(f"/user/patient-logs/{patient.id}?limit=4", headers=headers).get_json()
+    client.get(f"/user/patient-logs/{patient.id}?limit=4&cursor={page['next_cursor']}", headers=headers)
+
+    assert len(page["logs"]) == 4
+    assert_no_full_scans([(statement, parameters) for statement, parameters in hot_queries
+                          if "FROM medicine_log" in statement], sorted_from_index=True)
+
+
+def test_outbox_claims(hot_queries, add_medicine):
+    user, patient, medicine = add_medicine()
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    reminder_shards.materialize(
+        [Reminder(medicine.id, medicine.name, patient.id, patient.phone, user.id, medicine.expiry_at)], now
+    )
+    db.session.commit()
+
+    (scheduled_at, shard), = reminder_shards.open_shards(now)
+    assert reminder_shards.claim("node", scheduled_at, shard, now, limit=100)
+
+    assert_no_full_scans(hot_queries)
+
+
+def test_expiry_sweep(hot_queries, add_medicine):
+    add_medicine(duration=1)
+
+    assert retire_expired(datetime.utcnow() + timedelta(days=2))
+    db.session.commit()
+
+    assert_no_full_scans(hot_queries)
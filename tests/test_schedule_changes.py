@@ -0,0 +1,30 @@
+from datetime import datetime
+from app.models import Patient, Medicine
+from app.routes.authz import delete_medicines
+from app.scheduler import scheduler
+from app.scheduler.timing_wheel import timing_wheel
+
+
+def test_leader_applies_changes_made_by_other_workers(app, session, caregiver):
+    user, headers = caregiver
+    patient = Patient(name="patient", age=70, phone="+910000000000", user_id=user.id)
+    session.add(patient)
+    session.commit()
+    assert scheduler.leader.heartbeat()
+    scheduler.rebuild_timing_wheel()
+
+    response = app.test_client().post(f"/patient/add-course/{patient.id}", headers=headers, json={
+        "course_name": "course", "medicine_name": "Paracetamol", "medicine_duration": 5, "medicine_times": ["08:00"]
+    })
+    assert response.status_code == 201
+    medicine_id = session.query(Medicine.id).scalar()
+    assert timing_wheel.pop_due(8 * 60, datetime.utcnow()) == []  # Routes only journal the change
+
+    assert scheduler.apply_schedule_changes(datetime.utcnow()) == 1
+    assert [reminder.medicine_id for reminder in timing_wheel.pop_due(8 * 60, datetime.utcnow())] == [medicine_id]
+
+    # Deleted by another worker: dropped from the wheel on the next poll
+    delete_medicines([medicine_id])
+    session.commit()
+    scheduler.apply_schedule_changes(datetime.utcnow())
+    assert timing_wheel.pop_due(8 * 60, datetime.utcnow()) == []
@@ -0,0 +1,46 @@
+import time
+from app.models import MedicineLog
+from app.scheduler import twiml
+from app.scheduler.scheduler import call_context, medicine_log_buffer
+from app.scheduler.timing_wheel import Reminder
+
+
+def signed_context(medicine):
+    return call_context(Reminder(medicine.id, medicine.name, None, None, None, None))
+
+
+def test_signed_context_webhooks_run_no_queries(app, session, add_patient, statements):
+    _, _, (medicine,) = add_patient()
+    ctx = signed_context(medicine)
+    client = app.test_client()
+
+    statements.clear()
+    reminder = client.post(f"/twilio/twiml?ctx={ctx}")
+    answer = client.post(f"/twilio/handle_ivr_response?ctx={ctx}", data={"Digits": "1"})
+
+    assert reminder.status_code == answer.status_code == 200
+    assert "Paracetamol" in reminder.get_data(as_text=True)
+    assert statements == []
+    medicine_log_buffer.flush()
+    assert session.query(MedicineLog).filter_by(medicine_id=medicine.id, is_taken=True).count() == 1
+
+
+def test_tampered_and_expired_contexts_are_rejected(app, session, add_patient, monkeypatch):
+    _, _, (medicine,) = add_patient()
+    ctx = signed_context(medicine)
+    client = app.test_client()
+
+    assert client.post(f"/twilio/twiml?ctx={ctx[:-2]}xx").status_code == 400
+    monkeypatch.setattr(twiml, "CALL_CONTEXT_MAX_AGE", 0)
+    time.sleep(1.1)
+    assert client.post(f"/twilio/twiml?ctx={ctx}").status_code == 400
+    assert client.post(f"/twilio/handle_ivr_response?ctx={ctx}", data={"Digits": "1"}).status_code == 400
+
+
+def test_legacy_callbacks_are_off_by_default(app, session, add_patient):
+    _, patient, (medicine,) = add_patient()
+    client = app.test_client()
+
+    query = f"patient_id={patient.id}&medicine_id={medicine.id}"
+    assert client.post(f"/twilio/twiml?{query}").status_code == 400
+    assert client.post(f"/twilio/handle_ivr_response?{query}", data={"Digits": "1"}).status_code == 400